@@ -1,10 +1,71 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from contextlib import asynccontextmanager
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from decouple import config
+from api.utils.metrics import InstrumentedQueuePool, instrument_engine
+
+# Storage backend served by the API, either the MySQL server or a read-only SQLite snapshot file
+DB_BACKEND = config("DB_BACKEND", default="mysql")
+
+
+# Function to get the URL of the database of a backend
+def get_database_url(backend):
+    if backend == "mysql":
+        return f"mysql+aiomysql://{config('DB_USER')}:{config('DB_PASSWORD')}@{config('DB_HOST')}/{config('DB_NAME')}"
+    if backend == "sqlite":
+        # Snapshots are opened read-only, they are replaced as a whole by export_snapshot.py
+        return f"sqlite+aiosqlite:///file:{config('DB_PATH')}?mode=ro&uri=true"
+    raise ValueError(f"Unknown database backend '{backend}', DB_BACKEND must be mysql or sqlite")
+
 
 # Set up the database connection
-DATABASE_URL = f"mysql+mysqlconnector://{config('DB_USER')}:{config('DB_PASSWORD')}@{config('DB_HOST')}/{config('DB_NAME')}"
-engine = create_engine(DATABASE_URL)
+DATABASE_URL = get_database_url(DB_BACKEND)
+
+# Connection pool settings
+DB_POOL_SIZE = config("DB_POOL_SIZE", default=10, cast=int)
+DB_MAX_OVERFLOW = config("DB_MAX_OVERFLOW", default=20, cast=int)
+DB_POOL_RECYCLE = config("DB_POOL_RECYCLE", default=3600, cast=int)
+DB_POOL_PRE_PING = config("DB_POOL_PRE_PING", default=True, cast=bool)
+
+# The engine and the session factory are created when the application starts
+engine = None
+SessionLocal = None
+
+
+# Function to create the async engine and the session factory
+def init_engine():
+    global engine, SessionLocal
+    engine = create_async_engine(
+        DATABASE_URL,
+        poolclass=InstrumentedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+    # Record statement latencies and pool state for the /metrics endpoint
+    instrument_engine(engine, DB_POOL_SIZE + DB_MAX_OVERFLOW)
+    # Create a session to interact with the database
+    SessionLocal = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+
+# Function to close all the connections of the pool
+async def dispose_engine():
+    global engine, SessionLocal
+    if engine is not None:
+        await engine.dispose()
+    engine = None
+    SessionLocal = None
+
+
+# Lifespan of the FastAPI application, owns the database engine
+@asynccontextmanager
+async def lifespan(app):
+    init_engine()
+    yield
+    await dispose_engine()
+
 
-# Create a session to interact with the database
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Dependency providing a database session to the routes
+async def get_db():
+    async with SessionLocal() as db:
+        yield db
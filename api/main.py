@@ -1,16 +1,29 @@
 from fastapi import FastAPI
 from fastapi.responses import JSONResponse
-from api.routers import product_family, services, products, prices
+from api.routers import metrics, product_family, services, products, prices
+from api.utils.conditional import ConditionalMiddleware
 from api.utils.customHTTPException import CustomHTTPException
+from api.utils.metrics import MetricsMiddleware
+from api.utils.read_model import lifespan
+from api.utils.serialization import FastJSONResponse
 
-# Create a FastAPI instance
-api = FastAPI()
+# Create a FastAPI instance, the database engine and the read model are created in its lifespan,
+# responses are encoded with orjson
+api = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+
+# Answer conditional requests from the data version, compress and cache the response bodies,
+# the routes label the requests answered from the middleware in the metrics
+api.add_middleware(ConditionalMiddleware, routes=api.routes)
+
+# Time every request and label the statements it runs with its route
+api.add_middleware(MetricsMiddleware)
 
 # Include the router from the route module
 api.include_router(product_family.router, prefix="/api")
 api.include_router(services.router, prefix="/api")
 api.include_router(products.router, prefix="/api")
 api.include_router(prices.router, prefix="/api")
+api.include_router(metrics.router)
 
 
 # Custom exception handler to return a 404 response
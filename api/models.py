@@ -1,5 +1,5 @@
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String, JSON
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, Numeric, SmallInteger, String, JSON
 
 # Create a SQLAlchemy Base model
 Base = declarative_base()
@@ -12,21 +12,93 @@ class ProductFamily(Base):
     name = Column(String(255), unique=True, index=True)
 
 
+class Service(Base):
+    __tablename__ = "service"
+    id = Column(SmallInteger, primary_key=True)
+    code = Column(String(255), unique=True, nullable=False)
+
+
+class Region(Base):
+    __tablename__ = "region"
+    id = Column(SmallInteger, primary_key=True)
+    code = Column(String(255), unique=True, nullable=False)
+
+
+class Location(Base):
+    __tablename__ = "location"
+    id = Column(SmallInteger, primary_key=True)
+    name = Column(String(255), unique=True, nullable=False)
+
+
 class Product(Base):
     __tablename__ = "product"
+    __table_args__ = (
+        Index("idx_family_service", "product_family_id", "service_id"),
+        Index("idx_region_service", "region_id", "service_id"),
+        Index("idx_service", "service_id", "id"),
+        Index("idx_service_sku", "service_id", "sku"),
+    )
     id = Column(Integer, primary_key=True, index=True)
-    product_family_id = Column(Integer, index=True)
-    sku = Column(String(255), index=True)
-    service_code = Column(String(255), index=True)
-    location = Column(String(255))
-    region_code = Column(String(255))
+    product_family_id = Column(Integer)
+    offer_name = Column(String(255))
+    sku = Column(String(255))
+    service_id = Column(SmallInteger, nullable=False)
+    location_id = Column(SmallInteger, nullable=False, index=True)
+    region_id = Column(SmallInteger, nullable=False)
     product_attributes = Column(JSON)
 
 
+# Longer attribute values are not in the attribute index
+ATTRIBUTE_VALUE_MAX_LENGTH = 255
+
+
+class ProductAttribute(Base):
+    __tablename__ = "product_attribute"
+    attribute_name = Column(String(255), primary_key=True)
+    attribute_value = Column(String(255), primary_key=True)
+    product_id = Column(Integer, primary_key=True, index=True)
+
+
+class AttributeStats(Base):
+    __tablename__ = "attribute_stats"
+    attribute_name = Column(String(255), primary_key=True)
+    attribute_value = Column(String(255), primary_key=True)
+    product_count = Column(Integer, nullable=False)
+
+
 class Price(Base):
     __tablename__ = "price"
     id = Column(Integer, primary_key=True, index=True)
     product_id = Column(Integer, index=True)
-    pricePerUnit = Column(String(255))
+    pricePerUnit = Column(Numeric(10, 6))
     unit = Column(String(255))
     description = Column(String(255))
+
+
+class PriceComparison(Base):
+    __tablename__ = "price_comparison"
+    __table_args__ = (
+        Index("idx_signature_rank", "signature", "price_rank"),
+        Index("idx_comparison_sku", "service_id", "sku"),
+        Index("idx_service_cheapest", "service_id", "price_rank", "price_per_unit"),
+        Index("idx_usage_cheapest", "service_id", "usage_type", "price_rank", "price_per_unit"),
+    )
+    product_id = Column(Integer, primary_key=True)
+    signature = Column(String(40), nullable=False)
+    offer_name = Column(String(255), nullable=False, index=True)
+    service_id = Column(SmallInteger, nullable=False)
+    usage_type = Column(String(255))
+    region_id = Column(SmallInteger, nullable=False)
+    location_id = Column(SmallInteger, nullable=False)
+    sku = Column(String(255))
+    price_per_unit = Column(Numeric(10, 6))
+    unit = Column(String(255))
+    price_rank = Column(Integer, nullable=False)
+    region_count = Column(Integer, nullable=False)
+
+
+class DataVersion(Base):
+    __tablename__ = "data_version"
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False)
+    updated_at = Column(DateTime)
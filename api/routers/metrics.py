@@ -0,0 +1,11 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+router = APIRouter()
+
+
+# Route to expose the request, query, pool and cache metrics in the Prometheus format
+@router.get("/metrics", include_in_schema=False)
+def get_metrics():
+    # The content type already holds its charset, media_type would append a second one
+    return Response(content=generate_latest(), headers={"Content-Type": CONTENT_TYPE_LATEST})
@@ -1,28 +1,157 @@
-from fastapi import APIRouter, Query
-from api.database import SessionLocal
-from api.models import Product, Price
+from typing import Dict, List, Optional
+from decouple import config
+from fastapi import APIRouter, Depends, Query
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from api.database import get_db
+from api.models import Location, Product, Price, PriceComparison, Region
+from api.utils.batch import resolve_price_lookups
+from api.utils.cache import cached_response
+from api.utils.customHTTPException import CustomHTTPException
+from api.utils.dimensions import join_dimensions, service_id
+from api.utils.pagination import decode_cursor, set_next_cursor
+from api.utils.read_model import get_read_model
+from api.utils.serialization import parse_fields, row_to_dict_of, rows_response
+from api.utils.streaming import STREAM_CHUNK_SIZE, stream_query, stream_rows
 
 router = APIRouter()
 
+# Largest number of lookups accepted by a single batch request
+BATCH_MAX_LOOKUPS = config("BATCH_MAX_LOOKUPS", default=5000, cast=int)
+
+PRICE_FIELDS = [Product.id.label("product_id"), Product.sku.label("sku"), Location.name.label("location"),
+                Region.code.label("region_code"), Price.pricePerUnit.label("price"), Price.unit.label("unit"),
+                Price.description.label("price_description")]
+PRICE_FIELD_MAP = {field.name: field for field in PRICE_FIELDS}
+PRICE_COLUMNS = list(PRICE_FIELD_MAP)
+
+COMPARISON_COLUMNS = [PriceComparison.product_id.label("product_id"), PriceComparison.sku.label("sku"),
+                      PriceComparison.usage_type.label("usage_type"), Location.name.label("location"),
+                      Region.code.label("region_code"), PriceComparison.price_per_unit.label("price"),
+                      PriceComparison.unit.label("unit"), PriceComparison.price_rank.label("price_rank"),
+                      PriceComparison.region_count.label("region_count")]
+
 
 # Define the route to get prices for a particular service
 @router.get("/prices/{service_code}")
-async def get_prices_for_service(service_code: str, skip: int = Query(0, ge=0),
-                                 limit: int = Query(100, le=100000)):
-    # Query the Product table to retrieve prices for the specified service
-    with SessionLocal() as db:
-        query = db.query(Product.id.label("product_id"), Product.sku.label("sku"), Product.location.label("location"),
-                         Product.region_code.label("region_code"), Price.pricePerUnit.label("price"),
-                         Price.unit.label("unit"), Price.description.label("description"))\
-                .join(Price, Price.product_id == Product.id)\
-                .filter(Product.service_code == service_code)\
-                .offset(skip)\
-                .limit(limit)\
-                .all()
-
-        # Convert the query results to a list of dictionaries
-        prices = [{"product_id": row.product_id, "sku": row.sku, "location": row.location,
-                   "region_code": row.region_code, "price": row.price, "unit": row.unit,
-                   "price_description": row.description} for row in query]
-
-    return prices
+async def get_prices_for_service(service_code: str, skip: int = Query(0, ge=0), limit: int = Query(100, le=100000),
+                                 cursor: str = Query(default=None, description="Cursor of the next page"),
+                                 fields: str = Query(default=None, description="Comma-separated fields to return, all by default"),
+                                 output_format: str = Query("json", alias="format", pattern="^(json|ndjson|csv)$",
+                                                            description="Response format, ndjson and csv are streamed"),
+                                 db: AsyncSession = Depends(get_db)):
+    names = parse_fields(fields, PRICE_COLUMNS)
+    after_id = decode_cursor(cursor, service_code) if cursor else None
+
+    # Answer from the in-memory read model when it is loaded
+    store = await get_read_model(db)
+    if store is not None:
+        positions = store.service_page(service_code, after_id, skip, limit, priced=True)
+        if output_format != "json":
+            # The stream outlives the request session, release its connection before streaming
+            await db.close()
+            return stream_rows(store.iter_rows(lambda chunk: store.project(chunk, names), positions, STREAM_CHUNK_SIZE),
+                               row_to_dict_of(names), names, output_format)
+        response = rows_response(store.project(positions, names), names)
+        set_next_cursor(response, service_code, len(positions), limit, int(store.ids[positions[-1]]) if len(positions) else None)
+        return response
+
+    # Query the requested columns of the prices of the specified service,
+    # the product id is always read last for the cursor of the next page
+    columns = [PRICE_FIELD_MAP[name] for name in names]
+    query = join_dimensions(select(*columns, Product.id).select_from(Product), columns)\
+        .join(Price, Price.product_id == Product.id)\
+        .filter(Product.service_id == service_id(service_code))\
+        .order_by(Product.id)\
+        .limit(limit)
+    # Seek past the last product of the previous page instead of skipping rows
+    if after_id is not None:
+        query = query.filter(Product.id > after_id)
+    else:
+        query = query.offset(skip)
+
+    # Stream large results from a server-side cursor instead of building the whole list
+    # the stream reads on its own session, so the connection of the request session is released first
+    if output_format != "json":
+        await db.close()
+        return stream_query(query, row_to_dict_of(names), names, output_format)
+
+    result = (await db.execute(query)).all()
+    response = rows_response(result, names)
+    set_next_cursor(response, service_code, len(result), limit, result[-1][-1] if result else None)
+    return response
+
+
+# Function to join the dimension tables of the price comparison rows to a query
+def join_comparison_dimensions(query):
+    return query.join(Location, Location.id == PriceComparison.location_id)\
+        .join(Region, Region.id == PriceComparison.region_id)
+
+
+# Define the route to get the cheapest region of every product of a service, cheapest products first
+@router.get("/prices/{service_code}/cheapest")
+async def get_cheapest_prices(service_code: str, usage_type: str = Query(default=None, description="Usage type without its region prefix"),
+                              skip: int = Query(0, ge=0), limit: int = Query(100, le=10000),
+                              db: AsyncSession = Depends(get_db)):
+    async def query_cheapest_prices():
+        # The comparison rows ranked first are read in price order from the (service_id, price_rank, price_per_unit) index
+        query = join_comparison_dimensions(select(*COMPARISON_COLUMNS).select_from(PriceComparison))\
+            .filter(PriceComparison.service_id == service_id(service_code), PriceComparison.price_rank == 1)\
+            .order_by(PriceComparison.price_per_unit, PriceComparison.product_id)\
+            .offset(skip).limit(limit)
+        if usage_type:
+            query = query.filter(PriceComparison.usage_type == usage_type)
+        return [row._asdict() for row in await db.execute(query)]
+
+    return await cached_response(db, "cheapest_prices", query_cheapest_prices,
+                                 service_code=service_code, usage_type=usage_type, skip=skip, limit=limit)
+
+
+# Define the route to compare the price of a product across the regions, cheapest region first
+@router.get("/prices/{service_code}/{sku}/regions")
+async def get_region_comparison(service_code: str, sku: str, limit: int = Query(100, le=1000),
+                                db: AsyncSession = Depends(get_db)):
+    async def query_region_comparison():
+        # The signature of the SKU is resolved in the same statement and its regions are read in rank order
+        signature = select(PriceComparison.signature)\
+            .filter(PriceComparison.service_id == service_id(service_code), PriceComparison.sku == sku)\
+            .limit(1).scalar_subquery()
+        query = join_comparison_dimensions(select(*COMPARISON_COLUMNS).select_from(PriceComparison))\
+            .filter(PriceComparison.signature == signature)\
+            .order_by(PriceComparison.price_rank, PriceComparison.product_id)\
+            .limit(limit)
+        return [row._asdict() for row in await db.execute(query)]
+
+    regions = await cached_response(db, "region_comparison", query_region_comparison,
+                                    service_code=service_code, sku=sku, limit=limit)
+    if not regions:
+        raise CustomHTTPException(status_code=404, detail="No price comparison found for the SKU")
+    return regions
+
+
+# A single lookup of a batch, either by SKU or by region and attribute values
+class PriceLookup(BaseModel):
+    service_code: str
+    sku: Optional[str] = None
+    region_code: Optional[str] = None
+    attributes: Dict[str, str] = {}
+
+
+class PriceBatchRequest(BaseModel):
+    lookups: List[PriceLookup]
+
+
+# Define the route to get the prices of many lookups at once
+@router.post("/prices/batch")
+async def get_prices_batch(batch: PriceBatchRequest, db: AsyncSession = Depends(get_db)):
+    if len(batch.lookups) > BATCH_MAX_LOOKUPS:
+        raise CustomHTTPException(status_code=400, detail=f"A batch holds at most {BATCH_MAX_LOOKUPS} lookups")
+
+    # Resolve all the lookups with a few set-based queries instead of one request per lookup
+    results = await resolve_price_lookups(db, batch.lookups, await get_read_model(db))
+
+    # Report every lookup in the order of the request, with the lookups that found no price
+    items = [{"index": index, "found": bool(prices), "prices": prices, **({"error": error} if error else {})}
+             for index, (prices, error) in enumerate(results)]
+    return {"results": items, "misses": sum(1 for item in items if not item["found"])}
@@ -1,6 +1,9 @@
-from fastapi import APIRouter, Query
-from api.database import SessionLocal
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from api.database import get_db
 from api.models import ProductFamily
+from api.utils.cache import cached_response
 
 router = APIRouter()
 
@@ -8,8 +11,11 @@ router = APIRouter()
 # Route to get all product families
 @router.get("/product-families/")
 async def get_product_families(skip: int = Query(0, description="Skip N product families", ge=0),
-                               limit: int = Query(100, description="Limit the number of results", le=1000)):
+                               limit: int = Query(100, description="Limit the number of results", le=1000),
+                               db: AsyncSession = Depends(get_db)):
     # Query the database for product families
-    with SessionLocal() as db:
-        product_families = db.query(ProductFamily).offset(skip).limit(limit).all()
-    return product_families
+    async def query_product_families():
+        result = await db.execute(select(ProductFamily).offset(skip).limit(limit))
+        return result.scalars().all()
+
+    return await cached_response(db, "product_families", query_product_families, skip=skip, limit=limit)
@@ -1,60 +1,127 @@
-from fastapi import APIRouter, Query
-from api.database import SessionLocal
-from api.models import Product, Price
+from typing import List
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from api.database import get_db
+from api.models import Location, Product, Price, Region, Service
 from api.utils.customHTTPException import CustomHTTPException
+from api.utils.dimensions import PRODUCT_FIELD_NAMES, PRODUCT_FIELDS, join_dimensions, service_id
+from api.utils.pagination import decode_cursor, set_next_cursor
+from api.utils.planner import build_predicates, estimate_predicates, plan_product_query
+from api.utils.read_model import get_read_model
+from api.utils.serialization import parse_fields, row_to_dict_of, rows_response
+from api.utils.streaming import STREAM_CHUNK_SIZE, stream_query, stream_rows
 
 router = APIRouter()
 
+PRODUCT_COLUMNS = PRODUCT_FIELD_NAMES
+PRODUCT_FIELD_MAP = {field.name: field for field in PRODUCT_FIELDS}
+PRODUCT_PRICE_FIELDS = [Product.id.label("product_id"), Product.product_family_id.label("product_family_id"),
+                        Product.sku.label("sku"), Location.name.label("location"), Service.code.label("service_code"),
+                        Region.code.label("region_code"), Price.pricePerUnit.label("price"), Price.unit.label("unit"),
+                        Price.description.label("price_description")]
+PRODUCT_PRICE_FIELD_MAP = {field.name: field for field in PRODUCT_PRICE_FIELDS}
+
+
+# Function to parse the name:value attribute predicates of a query
+def parse_attributes(attribute_name, attribute_value, attributes):
+    parsed = []
+    if attribute_name or attribute_value:
+        if not attribute_name or not attribute_value:
+            raise CustomHTTPException(status_code=400, detail="Missing query parameters")
+        parsed.append((attribute_name, attribute_value))
+    for attribute in attributes:
+        name, separator, value = attribute.partition(":")
+        if not separator or not name or not value:
+            raise CustomHTTPException(status_code=400, detail=f"Invalid attribute predicate '{attribute}', expected name:value")
+        parsed.append((name, value))
+    return parsed
+
 
 # Route to get all products of a particular service
 @router.get("/products/{service_code}")
-async def get_products(service_code: str, skip: int = Query(0, ge=0), limit: int = Query(100, le=100000)):
-    # Query the database for products of the specified service
-    with SessionLocal() as db:
-        products = db.query(Product).filter(Product.service_code == service_code).offset(skip).limit(limit).all()
-    return products
+async def get_products(service_code: str, skip: int = Query(0, ge=0), limit: int = Query(100, le=100000),
+                       cursor: str = Query(default=None, description="Cursor of the next page"),
+                       fields: str = Query(default=None, description="Comma-separated fields to return, all by default"),
+                       db: AsyncSession = Depends(get_db)):
+    names = parse_fields(fields, PRODUCT_COLUMNS)
+    after_id = decode_cursor(cursor, service_code) if cursor else None
 
+    # Answer from the in-memory read model when it is loaded
+    store = await get_read_model(db)
+    if store is not None:
+        positions = store.service_page(service_code, after_id, skip, limit)
+        response = rows_response(store.project(positions, names), names)
+        set_next_cursor(response, service_code, len(positions), limit, int(store.ids[positions[-1]]) if len(positions) else None)
+        return response
+
+    # Query the database for the requested columns of the products of the specified service,
+    # the product id is always read last for the cursor of the next page
+    columns = [PRODUCT_FIELD_MAP[name] for name in names]
+    query = join_dimensions(select(*columns, Product.id).select_from(Product), columns)\
+        .filter(Product.service_id == service_id(service_code)).order_by(Product.id).limit(limit)
+    # Seek past the last product of the previous page instead of skipping rows
+    if after_id is not None:
+        query = query.filter(Product.id > after_id)
+    else:
+        query = query.offset(skip)
+    products = (await db.execute(query)).all()
+    response = rows_response(products, names)
+    set_next_cursor(response, service_code, len(products), limit, products[-1][-1] if products else None)
+    return response
 
-# Route to get all products of a particular product attribute value
+
+# Route to get all products matching a set of product attribute values
 @router.get("/products/")
-def get_products_by_attribute(
+async def get_products_by_attribute(
     attribute_name: str = Query(default="", description="Name of the product attribute"),
     attribute_value: str = Query(default="", description="Value of the product attribute"),
+    attribute: List[str] = Query(default=[], description="Additional attribute predicates as name:value"),
+    service_code: str = Query(default=None, description="Service code"),
+    region_code: str = Query(default=None, description="Region code"),
+    min_price: float = Query(default=None, ge=0, description="Minimum price per unit"),
+    max_price: float = Query(default=None, ge=0, description="Maximum price per unit"),
     include_prices: bool = Query(default=False, description="Include prices in the response"),
+    fields: str = Query(default=None, description="Comma-separated fields to return, all by default"),
+    output_format: str = Query("json", alias="format", pattern="^(json|ndjson|csv)$",
+                               description="Response format, ndjson and csv are streamed"),
+    db: AsyncSession = Depends(get_db),
 ):
-    if not attribute_name or not attribute_value:
+    attributes = parse_attributes(attribute_name, attribute_value, attribute)
+    if not attributes:
         raise CustomHTTPException(status_code=400, detail="Missing query parameters")
-    else:
-        if include_prices:
-            with SessionLocal() as db:
-
-                product_prices = db.query(Product.id.label("product_id"), Product.product_family_id.label("product_family_id"),
-                                          Product.service_code.label("service_code"), Product.sku.label("sku"),
-                                          Product.location.label("location"), Product.region_code.label("region_code"),
-                                          Price.pricePerUnit.label("price"), Price.unit.label("unit"),
-                                          Price.description.label("description")).\
-                                          join(Price, Product.id == Price.product_id).\
-                                          filter(Product.product_attributes[attribute_name] == attribute_value).all()
-
-                # Check if any products match the condition
-                if not product_prices:
-                    raise CustomHTTPException(status_code=404, detail="No products found with the specified condition")
+    field_map = PRODUCT_PRICE_FIELD_MAP if include_prices else PRODUCT_FIELD_MAP
+    names = parse_fields(fields, list(field_map))
 
-                product_prices_result = [{"product_id": row.product_id, "product_family_id": row.product_family_id,
-                                          "sku": row.sku, "location": row.location, "service_code": row.service_code,
-                                          "region_code": row.region_code, "price": row.price, "unit": row.unit,
-                                          "price_description": row.description} for row in product_prices]
+    # Answer from the in-memory read model when it is loaded and indexes every attribute of the query
+    store = await get_read_model(db)
+    positions = store.match(attributes, service_code, region_code, min_price, max_price, include_prices) if store else None
+    if positions is not None:
+        if output_format != "json":
+            # The stream outlives the request session, release its connection before streaming
+            await db.close()
+            return stream_rows(store.iter_rows(lambda chunk: store.project(chunk, names), positions, STREAM_CHUNK_SIZE),
+                               row_to_dict_of(names), names, output_format)
+        # Check if any products match the condition
+        if not len(positions):
+            raise CustomHTTPException(status_code=404, detail="No products found with the specified condition")
+        return rows_response(store.project(positions, names), names)
 
-            return product_prices_result
-        else:
-            with SessionLocal() as db:
+    # Drive the query from the most selective predicate according to the loader statistics
+    predicates = await estimate_predicates(db, build_predicates(attributes, service_code, region_code))
+    query = plan_product_query([field_map[name] for name in names], predicates, join_price=include_prices,
+                               min_price=min_price, max_price=max_price)
 
-                products = db.query(Product).filter(Product.product_attributes[attribute_name] == attribute_value).all()
+    # Stream large results from a server-side cursor instead of building the whole list
+    # the stream reads on its own session, so the connection of the request session is released first
+    if output_format != "json":
+        await db.close()
+        return stream_query(query, row_to_dict_of(names), names, output_format)
 
-                # Check if any products match the condition
-                if not products:
-                    raise CustomHTTPException(status_code=404, detail="No products found with the specified condition")
+    products = (await db.execute(query)).all()
 
-                product_list = [product.__dict__ for product in products]
+    # Check if any products match the condition
+    if not products:
+        raise CustomHTTPException(status_code=404, detail="No products found with the specified condition")
 
-            return product_list
+    return rows_response(products, names)
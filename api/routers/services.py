@@ -1,31 +1,43 @@
-from fastapi import APIRouter, Query
-from api.database import SessionLocal
-from api.models import ProductFamily, Product
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from api.database import get_db
+from api.models import Product, Service
+from api.utils.cache import cached_response
+from api.utils.dimensions import PRODUCT_FIELDS, join_dimensions, product_family_id, region_id
 
 router = APIRouter()
 
 
 # Route to get all services under a product family
 @router.get("/services/{product_family_name}")
-async def get_services(product_family_name: str, skip: int = Query(0, ge=0), limit: int = Query(100, le=100000)):
+async def get_services(product_family_name: str, skip: int = Query(0, ge=0), limit: int = Query(100, le=100000),
+                       db: AsyncSession = Depends(get_db)):
     # Query the database for services under the specified product family
-    with SessionLocal() as db:
-        services = db.query(Product).filter(Product.product_family_id == ProductFamily.id,
-                                            ProductFamily.name == product_family_name).offset(skip).limit(limit).all()
-    return services
+    async def query_services():
+        result = await db.execute(join_dimensions(select(*PRODUCT_FIELDS).select_from(Product))
+                                  .filter(Product.product_family_id == product_family_id(product_family_name))
+                                  .offset(skip).limit(limit))
+        return [row._asdict() for row in result]
+
+    return await cached_response(db, "services", query_services,
+                                 product_family_name=product_family_name, skip=skip, limit=limit)
 
 
 # Define the route to get all services available in a region
 @router.get("/services/")
-async def get_services_in_region(region: str = Query(..., description="Region code")):
+async def get_services_in_region(region: str = Query(..., description="Region code"), db: AsyncSession = Depends(get_db)):
+    # The region is normalized once so the cache key and the query always agree
+    region = region.strip()
+
     # Query the Product table to retrieve services available in the specified region
-    with SessionLocal() as db:
-        query = db.query(Product.service_code)\
-                        .filter(Product.region_code == region)\
-                        .distinct()\
-                        .all()
+    async def query_services_in_region():
+        # The service keys of the region are read from the (region_id, service_id) index only
+        result = await db.execute(select(Service.code)
+                                  .filter(Service.id.in_(select(Product.service_id)
+                                                         .filter(Product.region_id == region_id(region)))))
 
         # Convert the query results to a list of service codes
-        service_codes = [service[0] for service in query]
+        return [service[0] for service in result]
 
-    return service_codes
+    return await cached_response(db, "services_in_region", query_services_in_region, region=region)
@@ -0,0 +1,162 @@
+from sqlalchemy import select, tuple_
+from api.models import Location, Price, Product, ProductAttribute, Region, Service
+from api.utils.dimensions import join_dimensions
+from api.utils.planner import build_predicates, choose_driver, estimate_predicates
+
+# Number of values sent in a single IN list
+BATCH_IN_CHUNK_SIZE = 1000
+
+PRICE_LOOKUP_COLUMNS = [Product.id.label("product_id"), Product.sku.label("sku"), Service.code.label("service_code"),
+                        Location.name.label("location"), Region.code.label("region_code"),
+                        Product.product_attributes.label("product_attributes"), Price.pricePerUnit.label("price"),
+                        Price.unit.label("unit"), Price.description.label("description")]
+
+
+# Function to split values into the chunks of the IN lists
+def chunked(values, size=BATCH_IN_CHUNK_SIZE):
+    values = list(values)
+    return [values[start:start + size] for start in range(0, len(values), size)]
+
+
+# Function to convert a product and price row to the dictionary returned for a lookup
+def lookup_row_to_dict(row):
+    return {"product_id": row.product_id, "sku": row.sku, "service_code": row.service_code,
+            "location": row.location, "region_code": row.region_code, "price": row.price,
+            "unit": row.unit, "price_description": row.description}
+
+
+# Function to check the region and attributes of a lookup against a candidate row
+def matches_lookup(row, lookup):
+    if lookup.region_code and row.region_code != lookup.region_code:
+        return False
+    product_attributes = row.product_attributes or {}
+    return all(name in product_attributes and str(product_attributes[name]) == value
+               for name, value in lookup.attributes.items())
+
+
+# Function to get the keys of the codes of a dimension table, codes that don't exist are left out
+async def dimension_ids(db, table, codes):
+    ids = {}
+    for chunk in chunked(codes):
+        ids.update((await db.execute(select(table.code, table.id).filter(table.code.in_(chunk)))).all())
+    return ids
+
+
+# Function to fetch the prices of the (service_code, sku) pairs with one query per chunk
+async def fetch_sku_rows(db, pairs):
+    # Resolve the service keys first so that the pairs can be looked up in the (service_id, sku) index
+    service_ids = await dimension_ids(db, Service, {service_code for service_code, _ in pairs})
+    pairs = [(service_ids[service_code], sku) for service_code, sku in pairs if service_code in service_ids]
+
+    rows = {}
+    for chunk in chunked(pairs):
+        result = await db.execute(join_dimensions(select(*PRICE_LOOKUP_COLUMNS).select_from(Product))
+                                  .join(Price, Price.product_id == Product.id)
+                                  .filter(tuple_(Product.service_id, Product.sku).in_(chunk))
+                                  .order_by(Product.id))
+        for row in result:
+            rows.setdefault((row.service_code, row.sku), []).append(row)
+    return rows
+
+
+# Function to fetch the prices of the products having the (attribute_name, attribute_value, region_code) keys with one
+# query per chunk, keys without a region code match the products of every region
+async def fetch_attribute_rows(db, keys, service_codes):
+    region_ids = await dimension_ids(db, Region, {region_code for _, _, region_code in keys if region_code})
+    rows = {}
+    # The attribute index is seeked first, the region of the products it points to is checked by the query
+    for regional in (False, True):
+        if regional:
+            values = [(name, value, region_ids[region_code]) for name, value, region_code in keys if region_code in region_ids]
+            key_columns = (ProductAttribute.attribute_name, ProductAttribute.attribute_value, Product.region_id)
+        else:
+            values = [(name, value) for name, value, region_code in keys if not region_code]
+            key_columns = (ProductAttribute.attribute_name, ProductAttribute.attribute_value)
+        for chunk in chunked(values):
+            query = select(ProductAttribute.attribute_name, ProductAttribute.attribute_value, *PRICE_LOOKUP_COLUMNS)\
+                .select_from(ProductAttribute)\
+                .join(Product, Product.id == ProductAttribute.product_id)
+            result = await db.execute(join_dimensions(query)
+                                      .join(Price, Price.product_id == Product.id)
+                                      .filter(tuple_(*key_columns).in_(chunk), Service.code.in_(service_codes))
+                                      .order_by(Product.id))
+            for row in result:
+                rows.setdefault((row.attribute_name, row.attribute_value, row.region_code if regional else None), []).append(row)
+    return rows
+
+
+# Function to fetch the prices of the products of the (service_code, region_code) pairs with one query per chunk
+async def fetch_region_rows(db, pairs):
+    service_ids = await dimension_ids(db, Service, {service_code for service_code, _ in pairs})
+    region_ids = await dimension_ids(db, Region, {region_code for _, region_code in pairs})
+    pairs = [(region_ids[region_code], service_ids[service_code]) for service_code, region_code in pairs
+             if service_code in service_ids and region_code in region_ids]
+
+    rows = {}
+    for chunk in chunked(pairs):
+        # The pairs are looked up in the (region_id, service_id) index
+        result = await db.execute(join_dimensions(select(*PRICE_LOOKUP_COLUMNS).select_from(Product))
+                                  .join(Price, Price.product_id == Product.id)
+                                  .filter(tuple_(Product.region_id, Product.service_id).in_(chunk))
+                                  .order_by(Product.id))
+        for row in result:
+            rows.setdefault((row.service_code, row.region_code), []).append(row)
+    return rows
+
+
+# Function to resolve a batch of price lookups with a few set-based queries, the (prices, error) results keep the order
+# of the lookups
+async def resolve_price_lookups(db, lookups, store=None):
+    results = [None] * len(lookups)
+    sku_lookups = []
+    attribute_lookups = []
+    for position, lookup in enumerate(lookups):
+        if lookup.sku:
+            sku_lookups.append(position)
+        elif lookup.attributes:
+            # The in-memory read model answers the lookups whose attributes it indexes
+            positions = store.match(list(lookup.attributes.items()), lookup.service_code, lookup.region_code,
+                                    priced=True) if store else None
+            if positions is not None:
+                results[position] = ([lookup_row_to_dict(row) for row in store.price_rows(positions)], None)
+            else:
+                attribute_lookups.append(position)
+        else:
+            results[position] = ([], "Either sku or attributes is required")
+
+    # Lookups by SKU are answered by a single IN list on (service_code, sku)
+    sku_rows = await fetch_sku_rows(db, {(lookups[position].service_code, lookups[position].sku) for position in sku_lookups})
+    for position in sku_lookups:
+        lookup = lookups[position]
+        results[position] = ([lookup_row_to_dict(row) for row in sku_rows.get((lookup.service_code, lookup.sku), [])
+                              if matches_lookup(row, lookup)], None)
+
+    # Every attribute lookup is driven by its most selective attribute or its region according to the loader statistics,
+    # the products of all the drivers are read at once and the other predicates are checked here
+    predicates = {position: build_predicates(lookups[position].attributes.items(), region_code=lookups[position].region_code)
+                  for position in attribute_lookups}
+    await estimate_predicates(db, [predicate for lookup_predicates in predicates.values() for predicate in lookup_predicates])
+    drivers = {position: choose_driver(lookup_predicates) for position, lookup_predicates in predicates.items()}
+    for position, driver in drivers.items():
+        if driver is None:
+            results[position] = ([], "Attribute values longer than 255 characters cannot be looked up")
+
+    # The key a lookup's rows are read under, depending on the kind of its driver
+    def driver_key(position):
+        driver, lookup = drivers[position], lookups[position]
+        if driver.kind == "region_code":
+            return (lookup.service_code, lookup.region_code)
+        return (driver.name, driver.value, lookup.region_code or None)
+
+    driven = [position for position, driver in drivers.items() if driver]
+    region_driven = {position for position in driven if drivers[position].kind == "region_code"}
+    attribute_driven = [position for position in driven if drivers[position].kind != "region_code"]
+    region_rows = await fetch_region_rows(db, {driver_key(position) for position in region_driven})
+    attribute_rows = await fetch_attribute_rows(db, {driver_key(position) for position in attribute_driven},
+                                                {lookups[position].service_code for position in attribute_driven})
+    for position in driven:
+        lookup = lookups[position]
+        rows = (region_rows if position in region_driven else attribute_rows).get(driver_key(position), [])
+        results[position] = ([lookup_row_to_dict(row) for row in rows
+                              if row.service_code == lookup.service_code and matches_lookup(row, lookup)], None)
+    return results
@@ -0,0 +1,99 @@
+import json
+import time
+from collections import OrderedDict
+from decouple import config
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select
+from api.models import DataVersion
+
+# Response cache settings
+RESPONSE_CACHE_MAX_ENTRIES = config("RESPONSE_CACHE_MAX_ENTRIES", default=1024, cast=int)
+RESPONSE_CACHE_MAX_BYTES = config("RESPONSE_CACHE_MAX_BYTES", default=64 * 1024 * 1024, cast=int)
+RESPONSE_CACHE_TTL = config("RESPONSE_CACHE_TTL", default=300, cast=float)
+
+# Cache of the complete bodies of the API responses, compressed in the encoding the client accepts
+BODY_CACHE_MAX_ENTRIES = config("BODY_CACHE_MAX_ENTRIES", default=512, cast=int)
+BODY_CACHE_MAX_BYTES = config("BODY_CACHE_MAX_BYTES", default=64 * 1024 * 1024, cast=int)
+
+# How often the data version written by the loader is read from the database
+DATA_VERSION_CHECK_INTERVAL = config("DATA_VERSION_CHECK_INTERVAL", default=5, cast=float)
+
+
+# In-process LRU cache with a TTL and a bound on the number of entries and their size
+class ResponseCache:
+    def __init__(self, max_entries, max_bytes, ttl):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None or entry[2] < time.monotonic():
+            if entry is not None:
+                self.remove(key)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key, value, size):
+        # Values larger than the whole cache are not cached at all
+        if size > self.max_bytes:
+            return
+        if key in self.entries:
+            self.remove(key)
+        self.entries[key] = (value, size, time.monotonic() + self.ttl)
+        self.size += size
+        while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+            self.remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def remove(self, key):
+        _, size, _ = self.entries.pop(key)
+        self.size -= size
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+    def stats(self):
+        return {"entries": len(self.entries), "bytes": self.size, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions}
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL)
+body_cache = ResponseCache(BODY_CACHE_MAX_ENTRIES, BODY_CACHE_MAX_BYTES, RESPONSE_CACHE_TTL)
+
+# Last data version read from the database and when it was read
+data_version = {"version": None, "checked_at": 0.0}
+
+
+# Function to get the data version written by the loader, re-read at most every DATA_VERSION_CHECK_INTERVAL
+async def get_data_version(db):
+    now = time.monotonic()
+    if data_version["version"] is None or now - data_version["checked_at"] >= DATA_VERSION_CHECK_INTERVAL:
+        version = (await db.execute(select(DataVersion.version).filter(DataVersion.id == 1))).scalar() or 0
+        if version != data_version["version"]:
+            # Entries of older versions can never be hit again
+            response_cache.clear()
+            body_cache.clear()
+        data_version["version"] = version
+        data_version["checked_at"] = now
+    return data_version["version"]
+
+
+# Function to return the cached result of a route or compute and cache it
+async def cached_response(db, route, compute, **params):
+    # The key holds the data version so entries become invalid as soon as a new load lands
+    key = (await get_data_version(db), route, tuple(sorted(params.items())))
+    value = response_cache.get(key)
+    if value is None:
+        value = jsonable_encoder(await compute())
+        response_cache.set(key, value, len(json.dumps(value)))
+    return value
@@ -0,0 +1,169 @@
+import gzip
+import hashlib
+import time
+from urllib.parse import parse_qsl, urlencode
+import brotli
+from decouple import config
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.routing import Match
+from api import database
+from api.utils.cache import DATA_VERSION_CHECK_INTERVAL, body_cache, data_version, get_data_version
+
+# Bodies smaller than this are sent uncompressed, compressing them costs more than it saves
+COMPRESSION_MIN_SIZE = config("COMPRESSION_MIN_SIZE", default=1024, cast=int)
+
+# Brotli quality and gzip level, bodies of hot queries are compressed once per data version
+BROTLI_QUALITY = 5
+GZIP_LEVEL = 6
+
+# Content codings in the order they are preferred
+ENCODINGS = ("br", "gzip")
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+# Function to get the data version without touching the database while the last read is recent enough
+async def current_data_version():
+    if data_version["version"] is not None and time.monotonic() - data_version["checked_at"] < DATA_VERSION_CHECK_INTERVAL:
+        return data_version["version"]
+    async with database.SessionLocal() as db:
+        return await get_data_version(db)
+
+
+# Function to pick the content coding of the response from the Accept-Encoding header, None for identity
+def choose_encoding(accept_encoding):
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        weight = 1.0
+        params = params.strip().replace(" ", "")
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name.strip().lower()] = weight
+    for encoding in ENCODINGS:
+        if weights.get(encoding, weights.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+# Function to get the base of the ETags of a request, the same for every ordering of its query parameters
+def request_tag(version, scope):
+    query = urlencode(sorted(parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True)))
+    return hashlib.sha256(f"{version}\n{scope['path']}\n{query}".encode("utf-8")).hexdigest()[:32]
+
+
+# Function to build the strong ETag of a representation, every content coding gets its own
+def make_etag(tag, encoding):
+    return f'"{tag}-{encoding}"' if encoding else f'"{tag}"'
+
+
+# Function to find the ETag of an If-None-Match header matching a representation of the request, None if there is none,
+# * only matches a cached successful response since the route may reject the request
+def matching_etag(if_none_match, tag, cached_etag=None):
+    if not if_none_match:
+        return None
+    if if_none_match.strip() == "*":
+        return cached_etag
+    etags = {make_etag(tag, encoding) for encoding in (None, *ENCODINGS)}
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored
+    for value in if_none_match.split(","):
+        etag = value.strip().removeprefix("W/")
+        if etag in etags:
+            return etag
+    return None
+
+
+# Function to compress a body with a content coding
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+# ASGI middleware answering conditional GET requests of the API from the data version alone,
+# and compressing and caching the complete bodies of its successful responses
+class ConditionalMiddleware:
+    def __init__(self, app, routes=()):
+        self.app = app
+        self.routes = routes
+
+    # Function to label a request with its route the same way the router does, so the version read
+    # and the answers of the middleware itself are recorded under the route in the metrics
+    def match_route(self, scope):
+        for route in self.routes:
+            match, child_scope = route.matches(scope)
+            if match == Match.FULL:
+                scope.update(child_scope)
+                return
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or not scope["path"].startswith("/api/"):
+            await self.app(scope, receive, send)
+            return
+
+        self.match_route(scope)
+        request_headers = Headers(scope=scope)
+        encoding = choose_encoding(request_headers.get("accept-encoding", ""))
+        tag = request_tag(await current_data_version(), scope)
+        validators = [(b"vary", b"Accept-Encoding"), (b"cache-control", b"no-cache")]
+
+        cached = body_cache.get((tag, encoding))
+        cached_etag = Headers(raw=cached[0]).get("etag") if cached is not None else None
+
+        # The client already holds the response of this data version
+        etag = matching_etag(request_headers.get("if-none-match"), tag, cached_etag)
+        if etag is not None:
+            await send({"type": "http.response.start", "status": 304,
+                        "headers": [(b"etag", etag.encode("latin-1")), *validators]})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        if cached is not None:
+            headers, body = cached
+            await send({"type": "http.response.start", "status": 200, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        state = {"start": None, "started": False}
+
+        async def send_with_etag(message):
+            if message["type"] == "http.response.start":
+                state["start"] = message
+                return
+            if message["type"] != "http.response.body" or state["started"]:
+                await send(message)
+                return
+
+            start = state["start"]
+            state["started"] = True
+            if start["status"] != 200:
+                await send(start)
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=list(start["headers"]))
+            for name, value in validators:
+                headers[name.decode("latin-1")] = value.decode("latin-1")
+            # Streamed responses keep streaming, the ETag doesn't depend on their body
+            if message.get("more_body", False):
+                headers["etag"] = make_etag(tag, None)
+                await send({**start, "headers": headers.raw})
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            body_encoding = None
+            if encoding and len(body) >= COMPRESSION_MIN_SIZE and headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES):
+                body = compress(body, encoding)
+                body_encoding = encoding
+                headers["content-encoding"] = encoding
+                headers["content-length"] = str(len(body))
+            headers["etag"] = make_etag(tag, body_encoding)
+            body_cache.set((tag, encoding), (headers.raw, body), len(body))
+            await send({**start, "headers": headers.raw})
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_with_etag)
@@ -0,0 +1,36 @@
+from sqlalchemy import select
+from api.models import Location, Product, ProductFamily, Region, Service
+
+# Product columns with the dimension values in place of their keys
+PRODUCT_FIELDS = [Product.id.label("id"), Product.product_family_id.label("product_family_id"),
+                  Product.offer_name.label("offer_name"), Product.sku.label("sku"), Service.code.label("service_code"),
+                  Location.name.label("location"), Region.code.label("region_code"),
+                  Product.product_attributes.label("product_attributes")]
+PRODUCT_FIELD_NAMES = [field.name for field in PRODUCT_FIELDS]
+
+# Dimension tables of the products with their join conditions
+DIMENSION_JOINS = [(Service, Service.id == Product.service_id), (Location, Location.id == Product.location_id),
+                   (Region, Region.id == Product.region_id)]
+
+
+# Function to join the dimension tables of the products to a query, only the ones holding one of the fields
+# when they are given, the keys are never null so leaving a join out doesn't change the rows
+def join_dimensions(query, fields=None):
+    tables = None if fields is None else {field.element.table for field in fields}
+    for dimension, condition in DIMENSION_JOINS:
+        if tables is None or dimension.__table__ in tables:
+            query = query.join(dimension, condition)
+    return query
+
+
+# Functions to get the key of a dimension value, as a subquery evaluated once so that the product indexes can be used
+def service_id(code):
+    return select(Service.id).filter(Service.code == code).scalar_subquery()
+
+
+def region_id(code):
+    return select(Region.id).filter(Region.code == code).scalar_subquery()
+
+
+def product_family_id(name):
+    return select(ProductFamily.id).filter(ProductFamily.name == name).scalar_subquery()
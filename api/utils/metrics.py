@@ -0,0 +1,141 @@
+import logging
+import time
+from contextvars import ContextVar
+from decouple import config
+from prometheus_client import REGISTRY, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from api.utils.cache import body_cache, response_cache
+
+# Statements slower than this are logged with their bound parameters, 0 disables the log
+SLOW_QUERY_THRESHOLD_MS = config("SLOW_QUERY_THRESHOLD_MS", default=500, cast=float)
+
+slow_query_logger = logging.getLogger("api.slow_queries")
+
+# Engine whose pool state is exported, with the number of connections the pool may open
+pool_state = {"engine": None, "capacity": 0}
+
+# ASGI scope of the request being handled, read by the statement hooks to label them with the route
+current_scope = ContextVar("current_scope", default=None)
+
+REQUEST_DURATION = Histogram(
+    "api_request_duration_seconds", "Time spent handling a request, including streaming its body",
+    ["method", "route", "status"],
+)
+QUERY_DURATION = Histogram(
+    "api_db_query_duration_seconds", "Time spent executing a statement", ["route"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+QUERY_ROWS = Histogram(
+    "api_db_query_rows", "Rows returned or affected by a statement", ["route"],
+    buckets=(0, 1, 10, 100, 1000, 10000, 100000, 1000000),
+)
+POOL_CHECKOUT_DURATION = Histogram(
+    "api_db_pool_checkout_seconds", "Time spent waiting for a pooled connection, including opening new ones",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+
+
+# Function to get the route template of a request, unmatched paths share a label to bound the label values
+def route_label(scope):
+    if scope is None:
+        return "none"
+    route = scope.get("route")
+    return route.path if route is not None else "unmatched"
+
+
+# Connection pool timing how long a checkout waits for a connection
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        start_time = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_CHECKOUT_DURATION.observe(time.perf_counter() - start_time)
+
+
+# Function to record the latency and row count of every statement run through the engine
+def instrument_engine(engine, capacity):
+    sync_engine = engine.sync_engine
+    pool_state["engine"] = sync_engine
+    pool_state["capacity"] = capacity
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+        route = route_label(current_scope.get())
+        QUERY_DURATION.labels(route).observe(elapsed)
+        # Server-side cursors do not know their row count up front
+        if cursor.rowcount is not None and cursor.rowcount >= 0:
+            QUERY_ROWS.labels(route).observe(cursor.rowcount)
+        if SLOW_QUERY_THRESHOLD_MS and elapsed * 1000 >= SLOW_QUERY_THRESHOLD_MS:
+            slow_query_logger.warning("Slow query on %s took %.1f ms: %s parameters=%r",
+                                      route, elapsed * 1000, " ".join(statement.split()), parameters)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(exception_context):
+        # Failed statements never reach after_cursor_execute
+        start_times = exception_context.connection.info.get("query_start_time") if exception_context.connection else None
+        if start_times:
+            start_times.pop()
+
+
+# Collector reading the pool and response cache state when the metrics are scraped
+class StateCollector:
+    def collect(self):
+        if pool_state["engine"] is not None:
+            pool = pool_state["engine"].pool
+            capacity = pool_state["capacity"]
+            yield GaugeMetricFamily("api_db_pool_size", "Connections kept open by the pool", value=pool.size())
+            yield GaugeMetricFamily("api_db_pool_checked_out", "Connections in use", value=pool.checkedout())
+            yield GaugeMetricFamily("api_db_pool_overflow", "Connections opened above the pool size", value=max(pool.overflow(), 0))
+            yield GaugeMetricFamily("api_db_pool_saturation", "Share of the pool capacity in use",
+                                    value=pool.checkedout() / capacity if capacity else 0.0)
+
+        stats = response_cache.stats()
+        yield GaugeMetricFamily("api_response_cache_entries", "Entries in the response cache", value=stats["entries"])
+        yield GaugeMetricFamily("api_response_cache_bytes", "Size of the response cache", value=stats["bytes"])
+        yield CounterMetricFamily("api_response_cache_hits", "Response cache hits", value=stats["hits"])
+        yield CounterMetricFamily("api_response_cache_misses", "Response cache misses", value=stats["misses"])
+        yield CounterMetricFamily("api_response_cache_evictions", "Response cache evictions", value=stats["evictions"])
+
+        stats = body_cache.stats()
+        yield GaugeMetricFamily("api_body_cache_entries", "Entries in the response body cache", value=stats["entries"])
+        yield GaugeMetricFamily("api_body_cache_bytes", "Size of the response body cache", value=stats["bytes"])
+        yield CounterMetricFamily("api_body_cache_hits", "Response body cache hits", value=stats["hits"])
+        yield CounterMetricFamily("api_body_cache_misses", "Response body cache misses", value=stats["misses"])
+
+
+REGISTRY.register(StateCollector())
+
+
+# ASGI middleware timing every request until its last body chunk is sent
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        token = current_scope.set(scope)
+        start_time = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The route is only known once the router matched the request
+            REQUEST_DURATION.labels(scope["method"], route_label(scope), status["code"]).observe(time.perf_counter() - start_time)
+            current_scope.reset(token)
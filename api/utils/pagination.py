@@ -0,0 +1,35 @@
+import base64
+import binascii
+import json
+from api.utils.customHTTPException import CustomHTTPException
+
+# Response header carrying the cursor of the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+# Function to encode the position after the last row of a page as an opaque cursor
+def encode_cursor(service_code: str, last_id: int):
+    payload = json.dumps({"service_code": service_code, "id": last_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+# Function to decode a cursor into the last product id of the previous page
+def decode_cursor(cursor: str, service_code: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        last_id = int(payload["id"])
+        cursor_service_code = payload["service_code"]
+    except (binascii.Error, ValueError, TypeError, KeyError, UnicodeError):
+        raise CustomHTTPException(status_code=400, detail="Invalid cursor")
+
+    # A cursor is only valid for the service it was issued for
+    if cursor_service_code != service_code:
+        raise CustomHTTPException(status_code=400, detail="Cursor does not belong to this service")
+    return last_id
+
+
+# Function to set the next page cursor on the response if the page is full
+def set_next_cursor(response, service_code: str, page_size: int, limit: int, last_id: int):
+    if page_size and page_size == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(service_code, last_id)
@@ -0,0 +1,97 @@
+from sqlalchemy import select, tuple_
+from api.models import ATTRIBUTE_VALUE_MAX_LENGTH, AttributeStats, Price, Product, ProductAttribute
+from api.utils.dimensions import join_dimensions, region_id, service_id
+
+# Product columns that have their own index, with the function resolving the key of a value
+# and the attribute holding the same value
+INDEXED_COLUMNS = {
+    "service_code": (Product.service_id, service_id, "servicecode", "idx_service"),
+    "region_code": (Product.region_id, region_id, "regionCode", "idx_region_service"),
+}
+
+
+# A single equality predicate of a product query
+class Predicate:
+    def __init__(self, kind, name, value):
+        # kind is either "attribute" or one of the INDEXED_COLUMNS
+        self.kind = kind
+        self.name = name
+        self.value = value
+        self.estimate = None
+
+    # Attribute name and value under which the statistics of the predicate are stored
+    def stats_key(self):
+        if self.kind == "attribute":
+            return (self.name, self.value)
+        return (INDEXED_COLUMNS[self.kind][2], self.value)
+
+    def indexed(self):
+        return len(self.name) <= ATTRIBUTE_VALUE_MAX_LENGTH and len(self.value) <= ATTRIBUTE_VALUE_MAX_LENGTH
+
+    def residual_filter(self):
+        if self.kind == "attribute":
+            return Product.product_attributes[self.name].as_string() == self.value
+        column, to_id, _, _ = INDEXED_COLUMNS[self.kind]
+        return column == to_id(self.value)
+
+
+# Function to build the predicates of a product query
+def build_predicates(attributes, service_code=None, region_code=None):
+    predicates = [Predicate("attribute", name, value) for name, value in attributes]
+    if service_code:
+        predicates.append(Predicate("service_code", "service_code", service_code))
+    if region_code:
+        predicates.append(Predicate("region_code", "region_code", region_code))
+    return predicates
+
+
+# Function to estimate the number of products matching every indexed predicate from the loader statistics
+async def estimate_predicates(db, predicates):
+    keys = [predicate.stats_key() for predicate in predicates if predicate.indexed()]
+    counts = {}
+    if keys:
+        result = await db.execute(select(AttributeStats)
+                                  .filter(tuple_(AttributeStats.attribute_name, AttributeStats.attribute_value).in_(keys)))
+        counts = {(stats.attribute_name, stats.attribute_value): stats.product_count for stats in result.scalars()}
+    for predicate in predicates:
+        if predicate.indexed():
+            # Values missing from the statistics match no product at all
+            predicate.estimate = counts.get(predicate.stats_key(), 0)
+    return predicates
+
+
+# Function to pick the most selective indexed predicate to drive the query
+def choose_driver(predicates):
+    candidates = [predicate for predicate in predicates if predicate.estimate is not None]
+    return min(candidates, key=lambda predicate: predicate.estimate) if candidates else None
+
+
+# Function to build a product query driven by the most selective predicate, the others are residual filters
+def plan_product_query(columns, predicates, join_price=False, min_price=None, max_price=None):
+    driver = choose_driver(predicates)
+    if driver is not None and driver.kind == "attribute":
+        # Seek the attribute index first and join the products it points to
+        query = select(*columns).select_from(ProductAttribute)\
+            .join(Product, Product.id == ProductAttribute.product_id)\
+            .filter(ProductAttribute.attribute_name == driver.name, ProductAttribute.attribute_value == driver.value)
+    else:
+        query = select(*columns).select_from(Product)
+        if driver is not None:
+            _, _, _, index_name = INDEXED_COLUMNS[driver.kind]
+            query = query.with_hint(Product, f"FORCE INDEX ({index_name})", "mysql").filter(driver.residual_filter())
+
+    # The dimension tables are joined after the driver so they are read by primary key
+    query = join_dimensions(query, columns)
+    if join_price or min_price is not None or max_price is not None:
+        query = query.join(Price, Price.product_id == Product.id)
+    if min_price is not None:
+        query = query.filter(Price.pricePerUnit >= min_price)
+    if max_price is not None:
+        query = query.filter(Price.pricePerUnit <= max_price)
+
+    for predicate in predicates:
+        if predicate is not driver:
+            query = query.filter(predicate.residual_filter())
+
+    # Keep MySQL from reordering the joins away from the chosen driver
+    return query.prefix_with("STRAIGHT_JOIN", dialect="mysql")
@@ -0,0 +1,273 @@
+import asyncio
+import logging
+from array import array
+from collections import namedtuple
+from contextlib import asynccontextmanager
+import numpy as np
+import orjson
+from decouple import config
+from sqlalchemy import select
+from api import database
+from api.models import DataVersion, Price, Product
+from api.utils.cache import get_data_version
+from api.utils.dimensions import PRODUCT_FIELD_NAMES, PRODUCT_FIELDS, join_dimensions
+
+# Serve the product and price routes from an in-memory columnar copy of the tables
+READ_MODEL_ENABLED = config("READ_MODEL_ENABLED", default=False, cast=bool)
+
+# Product attributes indexed by the read model, predicates on other attributes are answered by MySQL
+READ_MODEL_ATTRIBUTES = config(
+    "READ_MODEL_ATTRIBUTES",
+    default="instanceType,instanceFamily,memory,vcpu,operatingSystem,tenancy,storageClass,volumeType,"
+            "databaseEngine,deploymentOption,usagetype,operation",
+    cast=lambda v: [s.strip() for s in v.split(",") if s.strip()],
+)
+
+# Number of rows fetched per round trip while the read model is built
+READ_MODEL_FETCH_SIZE = 10000
+
+logger = logging.getLogger("api.read_model")
+
+ProductRow = namedtuple("ProductRow", PRODUCT_FIELD_NAMES)
+PriceRow = namedtuple("PriceRow", ["product_id", "product_family_id", "sku", "location", "service_code", "region_code",
+                                   "price", "unit", "description"])
+PRICE_ROW_COLUMNS = PriceRow._fields[:-1] + ("price_description",)
+
+EMPTY_POSITIONS = np.empty(0, dtype=np.int32)
+
+# Read model currently served and the task building the next one
+read_model = {"store": None, "task": None}
+
+
+# Function to group the positions of the rows by their code, positions stay in id order
+def build_index(codes, size):
+    order = np.argsort(codes, kind="stable").astype(np.int32)
+    return np.split(order, np.cumsum(np.bincount(codes, minlength=size))[:-1])
+
+
+# Function to parse a price stored as text, prices that are not numbers never match a price filter
+def parse_price(price):
+    try:
+        return float(price)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+# Column of strings stored as integer codes into a dictionary of the distinct values
+class EncodedColumn:
+    def __init__(self, codes, values):
+        self.codes = codes
+        self.values = values
+
+    def decode(self, positions):
+        values = self.values
+        return [values[code] for code in self.codes[positions].tolist()]
+
+    # Mapping of every value to the positions of the rows holding it
+    def index(self):
+        return dict(zip(self.values, build_index(self.codes, len(self.values))))
+
+
+# Encoded column filled one value at a time while the rows are streamed in
+class EncodedColumnBuilder:
+    def __init__(self):
+        self.lookup = {}
+        self.codes = array("i")
+
+    def append(self, value):
+        self.codes.append(self.lookup.setdefault(value, len(self.lookup)))
+
+    def build(self):
+        return EncodedColumn(np.frombuffer(self.codes, dtype=np.int32), list(self.lookup))
+
+
+# Column of JSON documents stored back to back in a single buffer, a document is only parsed when it is decoded
+class JSONColumn:
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    def decode(self, positions):
+        data, offsets = self.data, self.offsets
+        return [orjson.loads(data[offsets[position]:offsets[position + 1]]) for position in positions.tolist()]
+
+
+# Columns of the product and price tables filled from the partitions of the streamed query, rows come in product id order
+class ColumnStoreBuilder:
+    ENCODED_COLUMNS = ("family_ids", "offer_names", "skus", "service_codes", "locations", "region_codes",
+                       "price_texts", "units", "descriptions")
+
+    def __init__(self, indexed_attributes):
+        self.ids = array("q")
+        self.columns = {name: EncodedColumnBuilder() for name in self.ENCODED_COLUMNS}
+        self.attribute_data = bytearray()
+        self.attribute_offsets = array("q", [0])
+        # Only the values of the indexed attributes are kept apart from the JSON documents
+        self.attribute_values = {name: EncodedColumnBuilder() for name in indexed_attributes}
+        self.has_price = array("b")
+        self.prices = array("d")
+
+    def add_rows(self, rows):
+        columns = self.columns
+        for (product_id, family_id, offer_name, sku, service_code, location, region_code, attributes,
+             price_product_id, price, unit, description) in rows:
+            # The price join repeats a product for every extra price, the first one is kept
+            if self.ids and self.ids[-1] == product_id:
+                continue
+            self.ids.append(product_id)
+            for name, value in zip(self.ENCODED_COLUMNS,
+                                   (family_id, offer_name, sku, service_code, location, region_code, price, unit, description)):
+                columns[name].append(value)
+            self.attribute_data += orjson.dumps(attributes)
+            self.attribute_offsets.append(len(self.attribute_data))
+            # Attribute values are compared as text, the same way the product_attribute table stores them
+            for name, column in self.attribute_values.items():
+                value = attributes.get(name) if isinstance(attributes, dict) else None
+                column.append(str(value) if value is not None else None)
+            self.has_price.append(price_product_id is not None)
+            self.prices.append(parse_price(price))
+
+
+# Columnar copy of the product and price tables, rows are sorted by product id
+class ColumnStore:
+    def __init__(self, version, builder):
+        self.version = version
+        self.ids = np.frombuffer(builder.ids, dtype=np.int64)
+        (self.family_ids, self.offer_names, self.skus, self.service_codes, self.locations, self.region_codes,
+         self.price_texts, self.units, self.descriptions) = (builder.columns[name].build() for name in builder.ENCODED_COLUMNS)
+        self.attributes = JSONColumn(bytes(builder.attribute_data), np.frombuffer(builder.attribute_offsets, dtype=np.int64))
+        self.has_price = np.frombuffer(builder.has_price, dtype=np.int8).astype(bool)
+        self.prices = np.frombuffer(builder.prices, dtype=np.float64)
+
+        self.service_index = self.service_codes.index()
+        self.priced_service_index = {value: positions[self.has_price[positions]] for value, positions in self.service_index.items()}
+        self.region_index = self.region_codes.index()
+        self.attribute_indexes = {}
+        for name, values in builder.attribute_values.items():
+            index = values.build().index()
+            index.pop(None, None)
+            self.attribute_indexes[name] = index
+
+    def __len__(self):
+        return len(self.ids)
+
+    # Function to decode a column of the rows at the positions, columns are named like the fields of the responses
+    def decode(self, name, positions):
+        if name in ("id", "product_id"):
+            return self.ids[positions].tolist()
+        column = {"product_attributes": self.attributes, "product_family_id": self.family_ids,
+                  "offer_name": self.offer_names, "sku": self.skus,
+                  "service_code": self.service_codes, "location": self.locations, "region_code": self.region_codes,
+                  "price": self.price_texts, "unit": self.units, "price_description": self.descriptions}[name]
+        return column.decode(positions)
+
+    # Function to get the rows at the positions as tuples of the named columns, the other columns aren't decoded
+    def project(self, positions, names):
+        return list(zip(*(self.decode(name, positions) for name in names)))
+
+    def product_rows(self, positions):
+        return [ProductRow(*values) for values in self.project(positions, PRODUCT_FIELD_NAMES)]
+
+    def price_rows(self, positions):
+        return [PriceRow(*values) for values in self.project(positions, PRICE_ROW_COLUMNS)]
+
+    # Generator yielding the rows of the positions in chunks, so streamed responses only build one chunk at a time
+    def iter_rows(self, to_rows, positions, chunk_size):
+        for start in range(0, len(positions), chunk_size):
+            yield to_rows(positions[start:start + chunk_size])
+
+    # Function to get a page of the products of a service in id order, optionally only the ones with a price
+    def service_page(self, service_code, after_id=None, skip=0, limit=100, priced=False):
+        positions = (self.priced_service_index if priced else self.service_index).get(service_code, EMPTY_POSITIONS)
+        if after_id is not None:
+            positions = positions[np.searchsorted(self.ids[positions], after_id, side="right"):]
+        else:
+            positions = positions[skip:]
+        return positions[:limit]
+
+    # Function to get the positions of the products matching every predicate, None when a predicate isn't indexed
+    def match(self, attributes, service_code=None, region_code=None, min_price=None, max_price=None, priced=False):
+        candidates = []
+        for name, value in attributes:
+            if name not in self.attribute_indexes:
+                return None
+            candidates.append(self.attribute_indexes[name].get(value, EMPTY_POSITIONS))
+        if service_code:
+            candidates.append(self.service_index.get(service_code, EMPTY_POSITIONS))
+        if region_code:
+            candidates.append(self.region_index.get(region_code, EMPTY_POSITIONS))
+
+        # Intersect the smallest candidates first
+        candidates.sort(key=len)
+        positions = candidates[0] if candidates else np.arange(len(self), dtype=np.int32)
+        for other in candidates[1:]:
+            positions = np.intersect1d(positions, other, assume_unique=True)
+
+        if priced or min_price is not None or max_price is not None:
+            positions = positions[self.has_price[positions]]
+        if min_price is not None:
+            positions = positions[self.prices[positions] >= min_price]
+        if max_price is not None:
+            positions = positions[self.prices[positions] <= max_price]
+        return positions
+
+
+# Function to read the product and price tables into a new column store
+async def build_read_model():
+    async with database.SessionLocal() as db:
+        # Both reads run in the same transaction, so the rows belong to the version read
+        version = (await db.execute(select(DataVersion.version).filter(DataVersion.id == 1))).scalar() or 0
+        query = join_dimensions(select(*PRODUCT_FIELDS, Price.product_id, Price.pricePerUnit, Price.unit, Price.description)
+                                .select_from(Product))\
+            .outerjoin(Price, Price.product_id == Product.id)\
+            .order_by(Product.id)
+        result = await db.stream(query, execution_options={"yield_per": READ_MODEL_FETCH_SIZE})
+        # Every partition is encoded into the columns as it arrives, so only one partition of rows is held at once,
+        # encoding and indexing is CPU bound so it is kept off the event loop
+        builder = ColumnStoreBuilder(READ_MODEL_ATTRIBUTES)
+        async for partition in result.partitions(READ_MODEL_FETCH_SIZE):
+            await asyncio.to_thread(builder.add_rows, partition)
+
+    store = await asyncio.to_thread(ColumnStore, version, builder)
+    logger.info("Read model of data version %s built with %s products.", version, len(store))
+    return store
+
+
+# Function to replace the read model with a freshly built one
+async def refresh_read_model():
+    try:
+        read_model["store"] = await build_read_model()
+    except Exception:
+        logger.exception("Failed to build the read model, requests are answered by the database.")
+    finally:
+        read_model["task"] = None
+
+
+# Function to start building the read model unless a build is already running
+def start_read_model_refresh():
+    if read_model["task"] is None:
+        read_model["task"] = asyncio.create_task(refresh_read_model())
+
+
+# Function to get the read model of the current data version, None while it's disabled or being built
+async def get_read_model(db):
+    if not READ_MODEL_ENABLED:
+        return None
+    store = read_model["store"]
+    if store is not None and store.version == await get_data_version(db):
+        return store
+    # The tables changed since the read model was built, the database answers until the new one is ready
+    start_read_model_refresh()
+    return None
+
+
+# Lifespan of the FastAPI application, builds the read model once the database engine exists
+@asynccontextmanager
+async def lifespan(app):
+    async with database.lifespan(app):
+        if READ_MODEL_ENABLED:
+            start_read_model_refresh()
+        yield
+        if read_model["task"] is not None:
+            read_model["task"].cancel()
+        read_model["store"] = None
@@ -0,0 +1,39 @@
+from decimal import Decimal
+import orjson
+from fastapi.responses import JSONResponse
+from api.utils.customHTTPException import CustomHTTPException
+
+
+# Function to encode the values orjson doesn't know, the same way jsonable_encoder does
+def encode_default(value):
+    if isinstance(value, Decimal):
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+# Response encoding its content with orjson, routes return it directly so FastAPI skips jsonable_encoder
+class FastJSONResponse(JSONResponse):
+    def render(self, content):
+        return orjson.dumps(content, default=encode_default)
+
+
+# Function to parse the fields= parameter into the names of the columns to return, all of them by default
+def parse_fields(fields, available):
+    if not fields:
+        return list(available)
+    names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in available]
+    if unknown or not names:
+        raise CustomHTTPException(status_code=400, detail=f"Unknown fields '{', '.join(unknown) or fields}', "
+                                                          f"available fields are {', '.join(available)}")
+    return names
+
+
+# Function to build the JSON response of row tuples, values past the named columns are left out
+def rows_response(rows, names):
+    return FastJSONResponse([dict(zip(names, row)) for row in rows])
+
+
+# Function to get a function converting a row tuple to a dictionary of the named columns
+def row_to_dict_of(names):
+    return lambda row: dict(zip(names, row))
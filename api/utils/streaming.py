@@ -0,0 +1,67 @@
+import csv
+import io
+import json
+import orjson
+from fastapi.responses import StreamingResponse
+from api import database
+from api.utils.serialization import encode_default
+
+# Number of rows fetched from the server-side cursor and sent per chunk
+STREAM_CHUNK_SIZE = 1000
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+# Function to encode a chunk of rows as NDJSON lines, values are encoded the same way as in the JSON responses
+def encode_ndjson(rows):
+    return b"".join(orjson.dumps(row, default=encode_default) + b"\n" for row in rows)
+
+
+# Function to encode a chunk of rows as CSV lines, nested values are written as JSON
+def encode_csv(rows, columns, include_header):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if include_header:
+        writer.writerow(columns)
+    for row in rows:
+        writer.writerow([json.dumps(row[column]) if isinstance(row[column], (dict, list)) else row[column]
+                         for column in columns])
+    return buffer.getvalue()
+
+
+# Function to encode a chunk of rows in the output format
+def encode_rows(rows, columns, output_format, include_header):
+    if output_format == "csv":
+        return encode_csv(rows, columns, include_header)
+    return encode_ndjson(rows)
+
+
+# Function to stream chunks of rows as NDJSON or CSV, the CSV header is written even without rows
+async def encode_chunks(chunks, row_to_dict, columns, output_format):
+    include_header = output_format == "csv"
+    async for chunk in chunks:
+        yield encode_rows([row_to_dict(row) for row in chunk], columns, output_format, include_header)
+        include_header = False
+    if include_header:
+        yield encode_csv([], columns, include_header)
+
+
+# Function to stream the results of a query as NDJSON or CSV
+def stream_query(query, row_to_dict, columns, output_format):
+    async def generate():
+        # The session lives as long as the response so the server-side cursor stays open
+        async with database.SessionLocal() as db:
+            result = await db.stream(query, execution_options={"yield_per": STREAM_CHUNK_SIZE})
+            async for partition in result.partitions(STREAM_CHUNK_SIZE):
+                yield partition
+
+    return StreamingResponse(encode_chunks(generate(), row_to_dict, columns, output_format), media_type=MEDIA_TYPES[output_format])
+
+
+# Function to stream chunks of rows that are already in memory as NDJSON or CSV
+def stream_rows(chunks, row_to_dict, columns, output_format):
+    async def generate():
+        for chunk in chunks:
+            yield chunk
+
+    return StreamingResponse(encode_chunks(generate(), row_to_dict, columns, output_format), media_type=MEDIA_TYPES[output_format])
@@ -0,0 +1,12 @@
+# Function to rebuild the per-attribute value frequency statistics used by the API query planner
+def collect_attribute_stats(cursor):
+    cursor.execute("DELETE FROM attribute_stats")
+    cursor.execute(
+        """
+        INSERT INTO attribute_stats (attribute_name, attribute_value, product_count)
+        SELECT attribute_name, attribute_value, COUNT(*)
+        FROM product_attribute
+        GROUP BY attribute_name, attribute_value
+    """
+    )
+    return cursor.rowcount
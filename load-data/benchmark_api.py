@@ -0,0 +1,93 @@
+import argparse
+import requests
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from tabulate import tabulate
+from benchmark_utils import Timer, summarize_latencies, write_results
+
+# Routes of the API measured by the benchmark with their query parameters
+ROUTES = [
+    ("product families", "/api/product-families/", None),
+    ("services in a region", "/api/services/", {"region": "us-east-1"}),
+    ("services of a product family", "/api/services/Storage", {"limit": 100}),
+    ("products of a service", "/api/products/AmazonS3", {"limit": 100}),
+    ("prices of a service", "/api/prices/AmazonS3", {"limit": 100}),
+    ("cheapest prices of a service", "/api/prices/AmazonS3/cheapest", {"limit": 100}),
+    ("products by attribute", "/api/products/", {"attribute_name": "memory", "attribute_value": "1024 GiB", "service_code": "AmazonRDS"}),
+]
+
+# Each thread keeps its own HTTP session so that connections are reused like a real client would
+thread_local = threading.local()
+
+
+# Function to get the HTTP session of the current thread
+def get_session():
+    if not hasattr(thread_local, "session"):
+        thread_local.session = requests.Session()
+    return thread_local.session
+
+
+# Function to request a route once, timing the full response
+def request_route(url, params):
+    with Timer() as timer:
+        response = get_session().get(url, params=params)
+    return timer.elapsed, response.status_code
+
+
+# Function to measure a route under concurrent requests
+def benchmark_route(base_url, name, path, params, requests_count, concurrency, warmup):
+    url = base_url.rstrip("/") + path
+    for _ in range(warmup):
+        request_route(url, params)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        with Timer() as timer:
+            responses = list(executor.map(lambda _: request_route(url, params), range(requests_count)))
+    samples = [elapsed for elapsed, _ in responses]
+    errors = sum(1 for _, status_code in responses if status_code >= 400)
+    return {
+        "name": name,
+        "path": path,
+        "errors": errors,
+        "requests_per_sec": round(requests_count / timer.elapsed, 2) if timer.elapsed else 0.0,
+        **summarize_latencies(samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the API routes under concurrent load.")
+    parser.add_argument("--base-url", default="http://localhost:8000", help="Base URL of the running API")
+    parser.add_argument("--requests", type=int, default=200, help="Timed requests sent to every route")
+    parser.add_argument("--concurrency", type=int, default=8, help="Number of concurrent clients")
+    parser.add_argument("--warmup", type=int, default=5, help="Untimed requests sent to every route before measuring")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = [
+        benchmark_route(args.base_url, name, path, params, args.requests, args.concurrency, args.warmup)
+        for name, path, params in ROUTES
+    ]
+
+    # Print the results as a table
+    table = tabulate(
+        [
+            (result["name"], result["requests_per_sec"], result["p50_ms"], result["p95_ms"], result["p99_ms"], result["errors"])
+            for result in results
+        ],
+        headers=["Route", "Requests/sec", "p50 (ms)", "p95 (ms)", "p99 (ms)", "Errors"],
+        tablefmt="grid",
+    )
+    print(table)
+
+    if args.output:
+        parameters = {
+            "base_url": args.base_url,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "warmup": args.warmup,
+        }
+        write_results(args.output, "api", parameters, results)
+
+
+if __name__ == "__main__":
+    main()
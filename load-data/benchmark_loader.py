@@ -0,0 +1,124 @@
+import argparse
+import json
+import os
+import tempfile
+import mysql.connector
+from decouple import config
+from tabulate import tabulate
+from benchmark_utils import Timer, write_results
+from bulk_writer import create_writer
+from create_database import create_database_and_tables
+from generate_offer import generate_offers
+from offer_reader import read_offer_streaming
+
+
+# Function to load the offer files of a generated offer index
+def read_generated_index(output_dir, index_path):
+    with open(index_path, "r") as index_file:
+        offers = json.load(index_file)["offers"]
+    return {
+        offer_name: os.path.join(output_dir, offer_details["currentVersionUrl"].lstrip("/"))
+        for offer_name, offer_details in offers.items()
+    }
+
+
+# Function to measure how fast the offer files are parsed without touching the database
+def benchmark_parse(offer_paths, spool_dir):
+    record_count = 0
+    with Timer() as timer:
+        for offer_path in offer_paths.values():
+            for _ in read_offer_streaming(offer_path, spool_dir):
+                record_count += 1
+    return {
+        "name": "parse",
+        "records": record_count,
+        "seconds": round(timer.elapsed, 4),
+        "records_per_sec": round(record_count / timer.elapsed, 2) if timer.elapsed else 0.0,
+    }
+
+
+# Function to measure loading the offer files into a fresh scratch database with an insert mode
+def benchmark_insert_mode(db_config, database_name, insert_mode, offer_paths, chunk_size, spool_dir):
+    connection = mysql.connector.connect(**db_config, allow_local_infile=insert_mode == "infile")
+    cursor = connection.cursor()
+    try:
+        # Every insert mode starts from an empty database
+        cursor.execute(f"DROP DATABASE IF EXISTS {database_name}")
+        create_database_and_tables(cursor, database_name)
+        connection.commit()
+
+        row_count = 0
+        with Timer() as timer:
+            for offer_name, offer_path in offer_paths.items():
+                writer = create_writer(insert_mode, offer_name, cursor, chunk_size, spool_dir)
+                for record in read_offer_streaming(offer_path, spool_dir):
+                    writer.write(record)
+                writer.flush()
+                row_count += writer.row_count
+            connection.commit()
+        return {
+            "name": f"load-{insert_mode}",
+            "rows": row_count,
+            "seconds": round(timer.elapsed, 4),
+            "rows_per_sec": round(row_count / timer.elapsed, 2) if timer.elapsed else 0.0,
+        }
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the loader on deterministic synthetic offer files.")
+    parser.add_argument("--offers", default="AmazonS3,AmazonRDS", help="Comma separated offer codes to generate")
+    parser.add_argument("--products", type=int, default=10000, help="Number of products per offer")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the offer generator")
+    parser.add_argument("--insert-modes", default="row,bulk,infile", help="Comma separated insert modes to measure")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Number of products buffered per chunk")
+    parser.add_argument("--database", default="aws_benchmark", help="Scratch database dropped and created for every insert mode")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    offer_codes = [code.strip() for code in args.offers.split(",")]
+    insert_modes = [mode.strip() for mode in args.insert_modes.split(",")]
+    spool_dir = config("OFFER_SPOOL_DIR", default="", cast=lambda v: v or None)
+    db_config = {
+        "host": config("DB_HOST"),
+        "user": config("DB_USER"),
+        "password": config("DB_PASSWORD"),
+    }
+
+    with tempfile.TemporaryDirectory(dir=spool_dir) as output_dir:
+        print(f"Generating {len(offer_codes)} offers of {args.products} products...")
+        offer_paths = read_generated_index(output_dir, generate_offers(output_dir, offer_codes, args.products, args.seed))
+
+        print("Measuring the parser...")
+        results = [benchmark_parse(offer_paths, spool_dir)]
+        for insert_mode in insert_modes:
+            print(f"Measuring the '{insert_mode}' insert mode...")
+            results.append(benchmark_insert_mode(db_config, args.database, insert_mode, offer_paths, args.chunk_size, spool_dir))
+
+    # Print the results as a table
+    table = tabulate(
+        [
+            (result["name"], result.get("records", result.get("rows")), result["seconds"],
+             result.get("records_per_sec", result.get("rows_per_sec")))
+            for result in results
+        ],
+        headers=["Stage", "Records/Rows", "Time (s)", "Throughput (/s)"],
+        tablefmt="grid",
+    )
+    print(table)
+
+    if args.output:
+        parameters = {
+            "offers": offer_codes,
+            "products": args.products,
+            "seed": args.seed,
+            "insert_modes": insert_modes,
+            "chunk_size": args.chunk_size,
+        }
+        write_results(args.output, "loader", parameters, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import json
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+
+
+# Function to get the value below which the given percentage of the sorted samples fall
+def percentile(sorted_samples, percent):
+    if not sorted_samples:
+        return 0.0
+    # Linear interpolation between the closest ranks
+    rank = (len(sorted_samples) - 1) * percent / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(sorted_samples) - 1)
+    return sorted_samples[lower] + (sorted_samples[upper] - sorted_samples[lower]) * (rank - lower)
+
+
+# Function to summarize latency samples given in seconds as milliseconds
+def summarize_latencies(samples):
+    sorted_samples = sorted(samples)
+    return {
+        "iterations": len(samples),
+        "mean_ms": round(sum(samples) * 1000 / len(samples), 4) if samples else 0.0,
+        "min_ms": round(sorted_samples[0] * 1000, 4) if samples else 0.0,
+        "p50_ms": round(percentile(sorted_samples, 50) * 1000, 4),
+        "p95_ms": round(percentile(sorted_samples, 95) * 1000, 4),
+        "p99_ms": round(percentile(sorted_samples, 99) * 1000, 4),
+        "max_ms": round(sorted_samples[-1] * 1000, 4) if samples else 0.0,
+    }
+
+
+# Function to describe the environment a benchmark ran in
+def benchmark_metadata(parameters):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": parameters,
+    }
+
+
+# Function to write benchmark results as JSON so that runs can be compared
+def write_results(path, benchmark, parameters, results):
+    with open(path, "w") as json_file:
+        json.dump({"benchmark": benchmark, "metadata": benchmark_metadata(parameters), "results": results}, json_file, indent=2)
+    print(f"Results written to '{path}'.")
+
+
+# Context manager measuring the wall time of a block
+class Timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed = time.perf_counter() - self.start
@@ -0,0 +1,254 @@
+import json
+import os
+import tempfile
+import time
+
+PRODUCT_COLUMNS = ("id", "offer_name", "product_family_id", "sku", "service_id", "location_id", "region_id", "product_attributes")
+PRICE_COLUMNS = ("product_id", "pricePerUnit", "unit", "description")
+ATTRIBUTE_COLUMNS = ("attribute_name", "attribute_value", "product_id")
+
+# Dimension tables interned by the writers, with the column holding their value
+DIMENSION_COLUMNS = {"product_family": "name", "service": "code", "region": "code", "location": "name"}
+
+# Longer attribute values are not indexed, the API falls back to the JSON column for them
+MAX_ATTRIBUTE_VALUE_LENGTH = 255
+
+
+# Function to atomically reserve a range of product ids, returns the first id of the range
+def reserve_product_ids(cursor, count):
+    # LAST_INSERT_ID(expr) makes the new value visible to this connection only,
+    # so concurrent loaders always receive disjoint ranges
+    cursor.execute(
+        """
+        UPDATE id_sequence
+        SET next_id = LAST_INSERT_ID(next_id + %s)
+        WHERE name = 'product'
+    """,
+        (count,),
+    )
+    cursor.execute("SELECT LAST_INSERT_ID()")
+    return cursor.fetchone()[0] - count
+
+
+# Function to build the attribute index rows of a product
+def build_attribute_rows(product_id, attributes):
+    return [
+        (attribute_name, str(attribute_value), product_id)
+        for attribute_name, attribute_value in attributes.items()
+        if len(attribute_name) <= MAX_ATTRIBUTE_VALUE_LENGTH and len(str(attribute_value)) <= MAX_ATTRIBUTE_VALUE_LENGTH
+    ]
+
+
+# Base writer that inserts every record with its own queries
+class RowWriter:
+    def __init__(self, offer_name, cursor, dimension_cursor=None):
+        self.offer_name = offer_name
+        self.cursor = cursor
+        # Dimension values and id ranges can be resolved on a separate autocommit
+        # connection so that parallel loaders don't wait on each other's row locks
+        self.dimension_cursor = dimension_cursor or cursor
+        # In-memory interning map of the dimension values seen by this writer
+        self.dimension_ids = {table: {} for table in DIMENSION_COLUMNS}
+        self.query_count = 0
+        self.row_count = 0
+        self.elapsed = 0.0
+
+    # Function to get the ID of a dimension value, creating it if it doesn't exist
+    def get_dimension_id(self, table, value):
+        dimension_id = self.dimension_ids[table].get(value)
+        if not dimension_id:
+            column = DIMENSION_COLUMNS[table]
+            # Look the value up first, a failed insert would still use up an AUTO_INCREMENT value
+            self.dimension_cursor.execute(f"SELECT id FROM {table} WHERE {column} = %s", (value,))
+            row = self.dimension_cursor.fetchone()
+            if row:
+                dimension_id = row[0]
+            else:
+                # LAST_INSERT_ID(id) returns the existing ID when another loader inserted the value meanwhile
+                self.dimension_cursor.execute(
+                    f"INSERT INTO {table} ({column}) VALUES (%s) ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)",
+                    (value,),
+                )
+                dimension_id = self.dimension_cursor.lastrowid
+                self.query_count += 1
+            self.dimension_ids[table][value] = dimension_id
+            self.query_count += 1
+        return dimension_id
+
+    # Function to get the dimension IDs of a record
+    def get_record_dimension_ids(self, record):
+        return (
+            self.get_dimension_id("product_family", record["product_family"]),
+            self.get_dimension_id("service", record["service_code"]),
+            self.get_dimension_id("location", record["location"]),
+            self.get_dimension_id("region", record["region_code"]),
+        )
+
+    def write(self, record):
+        start_time = time.time()
+        self.write_record(record)
+        self.row_count += 2
+        self.elapsed += time.time() - start_time
+
+    def write_record(self, record):
+        product_family_id, service_id, location_id, region_id = self.get_record_dimension_ids(record)
+
+        # Insert data into the 'product' table
+        self.cursor.execute(
+            """
+            INSERT INTO product (offer_name, product_family_id, sku, service_id, location_id, region_id, product_attributes)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """,
+            (
+                self.offer_name,
+                product_family_id,
+                record["sku"],
+                service_id,
+                location_id,
+                region_id,
+                json.dumps(record["attributes"]),
+            ),
+        )
+        product_id = self.cursor.lastrowid
+
+        # Insert data into the 'price' table
+        price = record["price"]
+        self.cursor.execute(
+            """
+            INSERT INTO price (product_id, pricePerUnit, unit, description)
+            VALUES (%s, %s, %s, %s)
+        """,
+            (product_id, price["pricePerUnit"], price["unit"], price["description"]),
+        )
+
+        # Insert data into the 'product_attribute' table
+        self.cursor.executemany(
+            "INSERT INTO product_attribute (attribute_name, attribute_value, product_id) VALUES (%s, %s, %s)",
+            build_attribute_rows(product_id, record["attributes"]),
+        )
+        self.query_count += 3
+
+    def flush(self):
+        pass
+
+    # Function to return the throughput of the writer
+    def rows_per_sec(self):
+        return self.row_count / self.elapsed if self.elapsed else 0.0
+
+
+# Writer that buffers records and inserts them in chunks with client-side product ids
+class BulkWriter(RowWriter):
+    def __init__(self, offer_name, cursor, chunk_size=5000, dimension_cursor=None):
+        super().__init__(offer_name, cursor, dimension_cursor)
+        self.chunk_size = chunk_size
+        self.product_rows = []
+        self.price_rows = []
+        self.attribute_rows = []
+        self.next_product_id = 0
+        self.last_product_id = 0
+
+    # Function to get the next product id from the reserved range
+    def allocate_product_id(self):
+        if self.next_product_id >= self.last_product_id:
+            self.next_product_id = reserve_product_ids(self.dimension_cursor, self.chunk_size)
+            self.last_product_id = self.next_product_id + self.chunk_size
+            self.query_count += 1
+        product_id = self.next_product_id
+        self.next_product_id += 1
+        return product_id
+
+    def write_record(self, record):
+        product_id = self.allocate_product_id()
+        price = record["price"]
+
+        product_family_id, service_id, location_id, region_id = self.get_record_dimension_ids(record)
+
+        self.product_rows.append(
+            (
+                product_id,
+                self.offer_name,
+                product_family_id,
+                record["sku"],
+                service_id,
+                location_id,
+                region_id,
+                json.dumps(record["attributes"]),
+            )
+        )
+        self.price_rows.append((product_id, price["pricePerUnit"], price["unit"], price["description"]))
+        self.attribute_rows.extend(build_attribute_rows(product_id, record["attributes"]))
+
+        if len(self.product_rows) >= self.chunk_size:
+            self.flush_rows()
+
+    def flush(self):
+        start_time = time.time()
+        self.flush_rows()
+        self.elapsed += time.time() - start_time
+
+    def flush_rows(self):
+        if not self.product_rows:
+            return
+        # Products are written first so every price row references an existing product
+        self.insert_rows("product", PRODUCT_COLUMNS, self.product_rows)
+        self.insert_rows("price", PRICE_COLUMNS, self.price_rows)
+        self.insert_rows("product_attribute", ATTRIBUTE_COLUMNS, self.attribute_rows)
+        self.product_rows = []
+        self.price_rows = []
+        self.attribute_rows = []
+
+    def insert_rows(self, table, columns, rows):
+        if not rows:
+            return
+        # mysql.connector rewrites executemany INSERTs into a single multi-row VALUES statement
+        self.cursor.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})",
+            rows,
+        )
+        self.query_count += 1
+
+
+# Function to encode a value as a field of a MySQL LOAD DATA TSV file
+def tsv_field(value):
+    if value is None:
+        return "\\N"
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+# Writer that flushes chunks through LOAD DATA LOCAL INFILE from generated TSV files
+class InfileWriter(BulkWriter):
+    def __init__(self, offer_name, cursor, chunk_size=50000, spool_dir=None, dimension_cursor=None):
+        super().__init__(offer_name, cursor, chunk_size, dimension_cursor)
+        self.spool_dir = spool_dir
+
+    def insert_rows(self, table, columns, rows):
+        if not rows:
+            return
+        fd, path = tempfile.mkstemp(suffix=".tsv", dir=self.spool_dir)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8", newline="\n") as tsv_file:
+                for row in rows:
+                    tsv_file.write("\t".join(tsv_field(value) for value in row) + "\n")
+            self.cursor.execute(
+                f"""
+                LOAD DATA LOCAL INFILE %s INTO TABLE {table}
+                CHARACTER SET utf8mb4
+                FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n'
+                ({', '.join(columns)})
+            """,
+                (path,),
+            )
+            self.query_count += 1
+        finally:
+            os.remove(path)
+
+
+# Function to create the writer for the given insert mode
+def create_writer(insert_mode, offer_name, cursor, chunk_size, spool_dir=None, dimension_cursor=None):
+    if insert_mode == "row":
+        return RowWriter(offer_name, cursor, dimension_cursor)
+    if insert_mode == "bulk":
+        return BulkWriter(offer_name, cursor, chunk_size, dimension_cursor)
+    if insert_mode == "infile":
+        return InfileWriter(offer_name, cursor, chunk_size, spool_dir, dimension_cursor)
+    raise ValueError(f"Unknown insert mode '{insert_mode}'")
@@ -0,0 +1,64 @@
+import argparse
+import json
+from tabulate import tabulate
+
+# Metrics compared between two runs, with whether a higher value is better
+METRICS = [
+    ("p50_ms", False),
+    ("p95_ms", False),
+    ("p99_ms", False),
+    ("requests_per_sec", True),
+    ("records_per_sec", True),
+    ("rows_per_sec", True),
+]
+
+
+# Function to load a benchmark results file
+def load_results(path):
+    with open(path, "r") as json_file:
+        return json.load(json_file)
+
+
+# Function to compare the results of two runs of the same benchmark
+def compare_results(baseline, candidate, threshold):
+    baseline_results = {result["name"]: result for result in baseline["results"]}
+    rows = []
+    regressions = 0
+    for result in candidate["results"]:
+        previous = baseline_results.get(result["name"])
+        if previous is None:
+            continue
+        for metric, higher_is_better in METRICS:
+            if metric not in result or metric not in previous or not previous[metric]:
+                continue
+            change = (result[metric] - previous[metric]) * 100 / previous[metric]
+            regressed = change < -threshold if higher_is_better else change > threshold
+            regressions += regressed
+            rows.append((result["name"], metric, previous[metric], result[metric], f"{change:+.1f}%", "REGRESSION" if regressed else ""))
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark results files.")
+    parser.add_argument("baseline", help="Results of the baseline run")
+    parser.add_argument("candidate", help="Results of the run to compare")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Change in percent reported as a regression")
+    args = parser.parse_args()
+
+    baseline = load_results(args.baseline)
+    candidate = load_results(args.candidate)
+    if baseline["benchmark"] != candidate["benchmark"]:
+        print(f"Error: cannot compare a '{baseline['benchmark']}' run with a '{candidate['benchmark']}' run.")
+        raise SystemExit(1)
+
+    print(f"Baseline: {baseline['metadata']['git_commit']} at {baseline['metadata']['timestamp']}")
+    print(f"Candidate: {candidate['metadata']['git_commit']} at {candidate['metadata']['timestamp']}")
+    rows, regressions = compare_results(baseline, candidate, args.threshold)
+    print(tabulate(rows, headers=["Name", "Metric", "Baseline", "Candidate", "Change", ""], tablefmt="grid"))
+    print(f"{regressions} regression(s) above {args.threshold}%.")
+    if regressions:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
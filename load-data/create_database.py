@@ -1,60 +1,104 @@
 # Function to create the database and tables
-def create_database_and_tables(cursor):
-    # Create the 'aws_database' database if it doesn't exist
-    cursor.execute("CREATE DATABASE IF NOT EXISTS aws_database")
-    cursor.execute("USE aws_database")
+def create_database_and_tables(cursor, database_name="aws_database"):
+    # Create the database, 'aws_database' by default, if it doesn't exist
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS {database_name}")
+    cursor.execute(f"USE {database_name}")
 
     # Create the 'product_family' table
     cursor.execute(
         """
         CREATE TABLE IF NOT EXISTS product_family (
             id INT AUTO_INCREMENT PRIMARY KEY,
-            name VARCHAR(255) NOT NULL
+            name VARCHAR(255) NOT NULL UNIQUE
         )
     """
     )
 
-    # Create the 'product' table
+    # Create the 'service', 'region' and 'location' dimension tables, the product table
+    # refers to their values through small integer keys instead of repeating the strings
     cursor.execute(
         """
-        CREATE TABLE IF NOT EXISTS product (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            product_family_id INT,
-            FOREIGN KEY (product_family_id) REFERENCES product_family(id),
-            sku VARCHAR(255),
-            service_code VARCHAR(255) NOT NULL,
-            location VARCHAR(255),
-            region_code VARCHAR(255),
-            product_attributes JSON
+        CREATE TABLE IF NOT EXISTS service (
+            id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+            code VARCHAR(255) NOT NULL UNIQUE
+        )
+    """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS region (
+            id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+            code VARCHAR(255) NOT NULL UNIQUE
         )
     """
     )
-
-    # Create region_code indexe on the 'product' table
     cursor.execute(
         """
-        CREATE INDEX idx_region ON product (region_code)
+        CREATE TABLE IF NOT EXISTS location (
+            id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL UNIQUE
+        )
     """
     )
 
-    # Create service_code index on the 'product' table
+    # Create the 'product' table with its indexes, the indexes are part of the
+    # table definition so that the tables can be created again on every run
     cursor.execute(
         """
-        CREATE INDEX idx_service ON product (service_code)
+        CREATE TABLE IF NOT EXISTS product (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            product_family_id INT,
+            FOREIGN KEY (product_family_id) REFERENCES product_family(id),
+            offer_name VARCHAR(255),
+            sku VARCHAR(255),
+            service_id SMALLINT UNSIGNED NOT NULL,
+            FOREIGN KEY (service_id) REFERENCES service(id),
+            location_id SMALLINT UNSIGNED NOT NULL,
+            FOREIGN KEY (location_id) REFERENCES location(id),
+            region_id SMALLINT UNSIGNED NOT NULL,
+            FOREIGN KEY (region_id) REFERENCES region(id),
+            product_attributes JSON,
+            -- product_family_id and service_id index, the services of a family are read from the index only
+            INDEX idx_family_service (product_family_id, service_id),
+            -- region_id and service_id index, the services of a region are read from the index only
+            INDEX idx_region_service (region_id, service_id),
+            -- service_id and id index used to seek to the next page of a service
+            INDEX idx_service (service_id, id),
+            -- service_id and sku index used by the batch price lookups
+            INDEX idx_service_sku (service_id, sku),
+            -- location index
+            INDEX idx_location (location_id),
+            -- offer_name and sku index used to diff an offer against the database
+            INDEX idx_offer_sku (offer_name, sku),
+            -- product_attributes index
+            INDEX idx_product_attributes ((CAST(product_attributes->>'$.memory' AS CHAR(255))))
+        )
     """
     )
 
-    # Create location index on the 'product' table
+    # Create the 'product_attribute' table indexing every attribute value of every product,
+    # binary collation keeps the lookups exact like the comparisons on the JSON column
     cursor.execute(
         """
-        CREATE INDEX idx_location ON product (location)
+        CREATE TABLE IF NOT EXISTS product_attribute (
+            attribute_name VARCHAR(255) NOT NULL,
+            attribute_value VARCHAR(255) NOT NULL,
+            product_id INT NOT NULL,
+            PRIMARY KEY (attribute_name, attribute_value, product_id),
+            INDEX idx_attribute_product (product_id)
+        ) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin
     """
     )
 
-    # Create product_attributes index on the 'product' table
+    # Create the 'attribute_stats' table with the number of products of every attribute value
     cursor.execute(
         """
-        CREATE INDEX idx_product_attributes ON product ((CAST(product_attributes->>'$.memory' AS CHAR(255))));
+        CREATE TABLE IF NOT EXISTS attribute_stats (
+            attribute_name VARCHAR(255) NOT NULL,
+            attribute_value VARCHAR(255) NOT NULL,
+            product_count INT NOT NULL,
+            PRIMARY KEY (attribute_name, attribute_value)
+        ) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin
     """
     )
 
@@ -70,3 +114,91 @@ def create_database_and_tables(cursor):
         )
     """
     )
+
+    # Create the 'price_comparison' table, rebuilt after every load with the rank of the price of every product
+    # among the products sharing its signature, i.e. the same product in the other regions
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS price_comparison (
+            product_id INT PRIMARY KEY,
+            signature CHAR(40) NOT NULL,
+            offer_name VARCHAR(255) NOT NULL,
+            service_id SMALLINT UNSIGNED NOT NULL,
+            usage_type VARCHAR(255),
+            region_id SMALLINT UNSIGNED NOT NULL,
+            location_id SMALLINT UNSIGNED NOT NULL,
+            sku VARCHAR(255),
+            price_per_unit DECIMAL(10, 6),
+            unit VARCHAR(255),
+            price_rank INT NOT NULL,
+            region_count INT NOT NULL,
+            -- signature and price_rank index, the regions of a product are read in price order
+            INDEX idx_signature_rank (signature, price_rank),
+            -- service_id and sku index used to find the signature of a product
+            INDEX idx_comparison_sku (service_id, sku),
+            -- indexes returning the cheapest region of every product of a service in price order
+            INDEX idx_service_cheapest (service_id, price_rank, price_per_unit),
+            INDEX idx_usage_cheapest (service_id, usage_type, price_rank, price_per_unit),
+            -- offer_name index used to replace the rows of a reloaded offer
+            INDEX idx_comparison_offer (offer_name)
+        )
+    """
+    )
+
+    # Create the 'id_sequence' table used to reserve product id ranges for bulk inserts
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS id_sequence (
+            name VARCHAR(64) PRIMARY KEY,
+            next_id BIGINT NOT NULL
+        )
+    """
+    )
+
+    # Move the product sequence past any ids inserted through AUTO_INCREMENT
+    cursor.execute(
+        """
+        INSERT INTO id_sequence (name, next_id)
+        SELECT 'product', COALESCE(MAX(id), 0) + 1 FROM product
+        ON DUPLICATE KEY UPDATE next_id = GREATEST(next_id, VALUES(next_id))
+    """
+    )
+
+    # Create the 'offer_version' table storing the version of every loaded offer
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS offer_version (
+            offer_name VARCHAR(255) PRIMARY KEY,
+            version_url VARCHAR(512) NOT NULL,
+            loaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    """
+    )
+
+    # Create the 'load_checkpoint' table recording how far the load of every offer got, the records of an
+    # offer file are read in file order, so the first record_count records (first_sku to last_sku) are committed
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS load_checkpoint (
+            offer_name VARCHAR(255) PRIMARY KEY,
+            version_url VARCHAR(512) NOT NULL,
+            record_count INT NOT NULL,
+            first_sku VARCHAR(255),
+            last_sku VARCHAR(255),
+            completed BOOLEAN NOT NULL DEFAULT FALSE,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    """
+    )
+
+    # Create the 'data_version' table, bumped by every load so the API can invalidate its caches
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS data_version (
+            id TINYINT PRIMARY KEY,
+            version BIGINT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    """
+    )
+    cursor.execute("INSERT IGNORE INTO data_version (id, version) VALUES (1, 0)")
@@ -0,0 +1,187 @@
+import json
+import time
+from bulk_writer import MAX_ATTRIBUTE_VALUE_LENGTH, BulkWriter
+
+STAGING_COLUMNS = (
+    "sku", "product_family_id", "service_id", "location_id", "region_id", "product_attributes",
+    "pricePerUnit", "unit", "description",
+)
+
+
+# Writer that stages an offer and applies only the differences to the product and price tables
+class DeltaWriter(BulkWriter):
+    def __init__(self, offer_name, cursor, chunk_size=5000, dimension_cursor=None):
+        super().__init__(offer_name, cursor, chunk_size, dimension_cursor)
+        self.inserted = 0
+        self.updated = 0
+        self.deleted = 0
+        self.staged = 0
+
+        # The shadow tables are temporary, so they are private to this connection
+        cursor.execute("DROP TEMPORARY TABLE IF EXISTS product_staging")
+        cursor.execute("DROP TEMPORARY TABLE IF EXISTS product_delta")
+        # Products whose attribute index rows have to be rebuilt
+        cursor.execute("CREATE TEMPORARY TABLE product_delta (id INT PRIMARY KEY)")
+        cursor.execute(
+            """
+            CREATE TEMPORARY TABLE product_staging (
+                sku VARCHAR(255) PRIMARY KEY,
+                product_family_id INT,
+                service_id SMALLINT UNSIGNED NOT NULL,
+                location_id SMALLINT UNSIGNED NOT NULL,
+                region_id SMALLINT UNSIGNED NOT NULL,
+                product_attributes JSON,
+                pricePerUnit DECIMAL(10, 6),
+                unit VARCHAR(255),
+                description TEXT
+            )
+        """
+        )
+
+    def write_record(self, record):
+        price = record["price"]
+        product_family_id, service_id, location_id, region_id = self.get_record_dimension_ids(record)
+        self.product_rows.append(
+            (
+                record["sku"],
+                product_family_id,
+                service_id,
+                location_id,
+                region_id,
+                json.dumps(record["attributes"]),
+                price["pricePerUnit"],
+                price["unit"],
+                price["description"],
+            )
+        )
+        if len(self.product_rows) >= self.chunk_size:
+            self.flush_rows()
+
+    def flush_rows(self):
+        if not self.product_rows:
+            return
+        # Duplicate SKUs keep the last staged row like a full reload would
+        columns = ", ".join(STAGING_COLUMNS)
+        updates = ", ".join(f"{column} = VALUES({column})" for column in STAGING_COLUMNS[1:])
+        self.cursor.executemany(
+            f"INSERT INTO product_staging ({columns}) VALUES ({', '.join(['%s'] * len(STAGING_COLUMNS))}) "
+            f"ON DUPLICATE KEY UPDATE {updates}",
+            self.product_rows,
+        )
+        self.staged += len(self.product_rows)
+        self.query_count += 1
+        self.product_rows = []
+
+    def flush(self):
+        start_time = time.time()
+        self.flush_rows()
+        self.apply_delta()
+        self.elapsed += time.time() - start_time
+
+    # Function to apply the staged offer to the product and price tables
+    def apply_delta(self):
+        # Everything below runs in the caller's transaction, so readers keep seeing
+        # the previous version of the offer until it is committed
+        self.execute_delta(
+            """
+            DELETE a FROM product_attribute a
+            JOIN product p ON p.id = a.product_id
+            LEFT JOIN product_staging s ON s.sku = p.sku
+            WHERE p.offer_name = %s AND s.sku IS NULL
+        """
+        )
+        self.execute_delta(
+            """
+            DELETE pr FROM price pr
+            JOIN product p ON p.id = pr.product_id
+            LEFT JOIN product_staging s ON s.sku = p.sku
+            WHERE p.offer_name = %s AND s.sku IS NULL
+        """
+        )
+        self.deleted = self.execute_delta(
+            """
+            DELETE p FROM product p
+            LEFT JOIN product_staging s ON s.sku = p.sku
+            WHERE p.offer_name = %s AND s.sku IS NULL
+        """
+        )
+
+        self.execute_delta(
+            """
+            INSERT INTO product_delta (id)
+            SELECT p.id FROM product p
+            JOIN product_staging s ON s.sku = p.sku
+            WHERE p.offer_name = %s AND NOT p.product_attributes <=> s.product_attributes
+        """
+        )
+        self.updated = self.execute_delta(
+            """
+            UPDATE product p
+            JOIN product_staging s ON s.sku = p.sku
+            JOIN price pr ON pr.product_id = p.id
+            SET p.product_family_id = s.product_family_id, p.service_id = s.service_id,
+                p.location_id = s.location_id, p.region_id = s.region_id, p.product_attributes = s.product_attributes,
+                pr.pricePerUnit = s.pricePerUnit, pr.unit = s.unit, pr.description = s.description
+            WHERE p.offer_name = %s AND NOT (
+                p.product_family_id <=> s.product_family_id AND p.service_id <=> s.service_id
+                AND p.location_id <=> s.location_id AND p.region_id <=> s.region_id
+                AND p.product_attributes <=> s.product_attributes AND pr.pricePerUnit <=> s.pricePerUnit
+                AND pr.unit <=> s.unit AND pr.description <=> s.description
+            )
+        """
+        )
+
+        self.inserted = self.execute_delta(
+            """
+            INSERT INTO product (offer_name, product_family_id, sku, service_id, location_id, region_id, product_attributes)
+            SELECT %s, s.product_family_id, s.sku, s.service_id, s.location_id, s.region_id, s.product_attributes
+            FROM product_staging s
+            LEFT JOIN product p ON p.offer_name = %s AND p.sku = s.sku
+            WHERE p.id IS NULL
+        """,
+            2,
+        )
+        # New products are the ones without a price yet
+        self.execute_delta(
+            """
+            INSERT INTO product_delta (id)
+            SELECT p.id FROM product p
+            LEFT JOIN price pr ON pr.product_id = p.id
+            WHERE p.offer_name = %s AND pr.product_id IS NULL
+        """
+        )
+        self.execute_delta(
+            """
+            INSERT INTO price (product_id, pricePerUnit, unit, description)
+            SELECT p.id, s.pricePerUnit, s.unit, s.description
+            FROM product_staging s
+            JOIN product p ON p.offer_name = %s AND p.sku = s.sku
+            LEFT JOIN price pr ON pr.product_id = p.id
+            WHERE pr.product_id IS NULL
+        """
+        )
+
+        # Rebuild the attribute index rows of the changed and new products
+        self.cursor.execute("DELETE a FROM product_attribute a JOIN product_delta d ON d.id = a.product_id")
+        self.cursor.execute(
+            f"""
+            INSERT INTO product_attribute (attribute_name, attribute_value, product_id)
+            SELECT attribute_names.name,
+                JSON_UNQUOTE(JSON_EXTRACT(p.product_attributes, CONCAT('$."', attribute_names.name, '"'))) AS value, p.id
+            FROM product_delta d
+            JOIN product p ON p.id = d.id
+            JOIN JSON_TABLE(JSON_KEYS(p.product_attributes), '$[*]' COLUMNS (name VARCHAR(1024) PATH '$')) attribute_names
+            HAVING CHAR_LENGTH(attribute_names.name) <= {MAX_ATTRIBUTE_VALUE_LENGTH}
+            AND CHAR_LENGTH(value) <= {MAX_ATTRIBUTE_VALUE_LENGTH}
+        """
+        )
+        self.query_count += 2
+
+        self.cursor.execute("DROP TEMPORARY TABLE product_staging")
+        self.cursor.execute("DROP TEMPORARY TABLE product_delta")
+        self.row_count = self.inserted + self.updated + self.deleted
+
+    def execute_delta(self, query, offer_name_count=1):
+        self.cursor.execute(query, (self.offer_name,) * offer_name_count)
+        self.query_count += 1
+        return self.cursor.rowcount
@@ -0,0 +1,79 @@
+import argparse
+import os
+import sys
+import time
+import mysql.connector
+from decouple import config
+from storage_backends import BACKENDS, SNAPSHOT_COLUMNS, create_backend
+
+# Number of rows read from MySQL and written to the snapshot at once
+EXPORT_BATCH_SIZE = 50000
+
+
+# Function to convert a row read by mysql.connector to the values stored in a snapshot
+def snapshot_row(row):
+    # JSON columns may be returned as bytes
+    return tuple(value.decode("utf-8") if isinstance(value, (bytes, bytearray)) else value for value in row)
+
+
+# Function to copy a table from MySQL into the snapshot in batches
+def export_table(source_cursor, backend, table, columns, batch_size):
+    source_cursor.execute(f"SELECT {', '.join(columns)} FROM {table}")
+    row_count = 0
+    while True:
+        rows = source_cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        backend.insert_rows(table, columns, [snapshot_row(row) for row in rows])
+        row_count += len(rows)
+    return row_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the loaded database into a read-only SQLite or DuckDB snapshot.")
+    parser.add_argument("output", help="Snapshot file to write, it is replaced once the export is complete")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="sqlite", help="Embedded engine of the snapshot")
+    parser.add_argument("--database", default=config("DB_NAME"), help="MySQL database to export")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE, help="Rows copied per batch")
+    args = parser.parse_args()
+
+    # The snapshot is written next to its final path and moved into place at the end,
+    # so services reading the previous snapshot never see a partial file
+    partial_path = f"{args.output}.partial"
+    if os.path.exists(partial_path):
+        os.remove(partial_path)
+
+    connection = mysql.connector.connect(
+        host=config("DB_HOST"), user=config("DB_USER"), password=config("DB_PASSWORD"), database=args.database
+    )
+    try:
+        backend = create_backend(args.backend, partial_path)
+        cursor = connection.cursor()
+        # Every table is read from the same consistent view, so the snapshot holds a single data version
+        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY")
+
+        start_time = time.time()
+        backend.create_tables()
+        for table, columns in SNAPSHOT_COLUMNS.items():
+            print(f"Exported {export_table(cursor, backend, table, columns, args.batch_size)} rows of '{table}'.")
+        connection.rollback()
+
+        print("Creating indexes...")
+        backend.create_indexes()
+        backend.finish()
+        os.replace(partial_path, args.output)
+        print(f"Wrote the {args.backend} snapshot '{args.output}' in {round(time.time() - start_time, 2)} s.")
+
+    except (mysql.connector.Error, RuntimeError) as error:
+        print(f"Error: {error}")
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        sys.exit(1)
+
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+import argparse
+import json
+import os
+import random
+import string
+
+# Regions of the synthetic offers, with their location names
+REGIONS = [
+    ("us-east-1", "US East (N. Virginia)"),
+    ("us-east-2", "US East (Ohio)"),
+    ("us-west-2", "US West (Oregon)"),
+    ("eu-west-1", "EU (Ireland)"),
+    ("eu-central-1", "EU (Frankfurt)"),
+    ("ap-south-1", "Asia Pacific (Mumbai)"),
+    ("ap-southeast-1", "Asia Pacific (Singapore)"),
+    ("ap-northeast-1", "Asia Pacific (Tokyo)"),
+]
+INSTANCE_FAMILIES = ["t3", "m5", "m6g", "c5", "c6g", "r5", "r6g", "x2g"]
+INSTANCE_SIZES = [("large", 2), ("xlarge", 4), ("2xlarge", 8), ("4xlarge", 16), ("8xlarge", 32), ("16xlarge", 64), ("32xlarge", 128)]
+PRODUCT_FAMILIES = {
+    "AmazonEC2": ["Compute Instance", "Storage", "Data Transfer"],
+    "AmazonRDS": ["Database Instance", "Database Storage", "Storage Snapshot"],
+    "AmazonS3": ["Storage", "API Request", "Data Transfer"],
+}
+TERM_CODE = "JRTCKXETXF"
+RATE_CODE = "6YS6EN2CT7"
+
+
+# Function to build a random number generator that only depends on the seed, offer and product index
+def product_random(seed, offer_code, index):
+    return random.Random(f"{seed}-{offer_code}-{index}")
+
+
+# Function to generate the SKU of a product
+def generate_sku(rng):
+    return "".join(rng.choices(string.ascii_uppercase + string.digits, k=16))
+
+
+# Function to generate a product in the shape of the AWS bulk price API
+def generate_product(seed, offer_code, index):
+    rng = product_random(seed, offer_code, index)
+    sku = generate_sku(rng)
+    region_code, location = rng.choice(REGIONS)
+    product_family = rng.choice(PRODUCT_FAMILIES.get(offer_code, ["Unknown"]))
+    family = rng.choice(INSTANCE_FAMILIES)
+    size, vcpu = rng.choice(INSTANCE_SIZES)
+    memory = vcpu * rng.choice([2, 4, 8])
+    attributes = {
+        "servicecode": offer_code,
+        "location": location,
+        "locationType": "AWS Region",
+        "regionCode": region_code,
+        "instanceType": f"{family}.{size}",
+        "instanceFamily": family,
+        "vcpu": str(vcpu),
+        "memory": f"{memory} GiB",
+        "storageClass": rng.choice(["General Purpose", "Infrequent Access", "Archive"]),
+        "operatingSystem": rng.choice(["Linux", "Windows", "RHEL"]),
+        "usagetype": f"{region_code.upper()}-BoxUsage:{family}.{size}",
+        "operation": rng.choice(["RunInstances", "CreateDBInstance", "PutObject"]),
+        "servicename": offer_code,
+    }
+    return sku, {"sku": sku, "productFamily": product_family, "attributes": attributes}
+
+
+# Function to generate the OnDemand term of a product
+def generate_term(seed, offer_code, index, sku):
+    rng = product_random(seed, offer_code, f"{index}-term")
+    term_code = f"{sku}.{TERM_CODE}"
+    return {
+        term_code: {
+            "offerTermCode": TERM_CODE,
+            "sku": sku,
+            "effectiveDate": "2023-09-01T00:00:00Z",
+            "priceDimensions": {
+                f"{term_code}.{RATE_CODE}": {
+                    "rateCode": f"{term_code}.{RATE_CODE}",
+                    "description": f"${rng.random():.4f} per unit for {offer_code}",
+                    "beginRange": "0",
+                    "endRange": "Inf",
+                    "unit": rng.choice(["Hrs", "GB-Mo", "Requests"]),
+                    "pricePerUnit": {"USD": f"{rng.uniform(0.0001, 20):.6f}"},
+                    "appliesTo": [],
+                }
+            },
+            "termAttributes": {},
+        }
+    }
+
+
+# Function to write a JSON object whose entries are produced one at a time
+def write_json_object(json_file, entries):
+    json_file.write("{")
+    for position, (key, value) in enumerate(entries):
+        if position:
+            json_file.write(",")
+        json_file.write(f"\n{json.dumps(key)}:{json.dumps(value)}")
+    json_file.write("\n}")
+
+
+# Generator yielding the indexes of the products of an offer, only those of a region when it is given
+def iter_product_indexes(offer_code, products, seed, region_code=None):
+    for index in range(products):
+        if region_code is None or generate_product(seed, offer_code, index)[1]["attributes"]["regionCode"] == region_code:
+            yield index
+
+
+# Generator yielding the OnDemand terms of the products of an offer
+def iter_terms(offer_code, indexes, seed):
+    for index in indexes:
+        sku, _ = generate_product(seed, offer_code, index)
+        yield sku, generate_term(seed, offer_code, index, sku)
+
+
+# Function to write a synthetic offer file without holding it in memory, with the products of a single region
+# when it is given
+def write_offer(path, offer_code, products, seed, region_code=None):
+    with open(path, "w") as json_file:
+        json_file.write(
+            '{"formatVersion":"v1.0","disclaimer":"Synthetic offer","offerCode":'
+            f'{json.dumps(offer_code)},"version":"synthetic-{seed}","publicationDate":"2023-09-01T00:00:00Z","products":'
+        )
+        write_json_object(json_file, (generate_product(seed, offer_code, index)
+                                      for index in iter_product_indexes(offer_code, products, seed, region_code)))
+        json_file.write(',"terms":{"OnDemand":')
+        write_json_object(json_file, iter_terms(offer_code, iter_product_indexes(offer_code, products, seed, region_code), seed))
+        json_file.write("}}\n")
+
+
+# Function to write the offer file of every region of an offer and the region index pointing to them
+def write_region_offers(output_dir, offer_code, products, seed):
+    regions = {}
+    for region_code, _ in REGIONS:
+        current_version_url = f"/offers/v1.0/aws/{offer_code}/current/{region_code}/index.json"
+        offer_path = os.path.join(output_dir, current_version_url.lstrip("/"))
+        os.makedirs(os.path.dirname(offer_path), exist_ok=True)
+        write_offer(offer_path, offer_code, products, seed, region_code)
+        regions[region_code] = {"regionCode": region_code, "currentVersionUrl": current_version_url}
+
+    region_index_url = f"/offers/v1.0/aws/{offer_code}/current/region_index.json"
+    with open(os.path.join(output_dir, region_index_url.lstrip("/")), "w") as index_file:
+        json.dump({"formatVersion": "v1.0", "regions": regions}, index_file, indent=2)
+    return region_index_url
+
+
+# Function to generate an offer index and its offer files laid out like the bulk price API, optionally along with
+# the region index and the offer file of every region
+def generate_offers(output_dir, offer_codes, products, seed, region_files=False):
+    offers = {}
+    for offer_code in offer_codes:
+        current_version_url = f"/offers/v1.0/aws/{offer_code}/current/index.json"
+        offer_path = os.path.join(output_dir, current_version_url.lstrip("/"))
+        os.makedirs(os.path.dirname(offer_path), exist_ok=True)
+        write_offer(offer_path, offer_code, products, seed)
+        offers[offer_code] = {"offerCode": offer_code, "currentVersionUrl": current_version_url}
+        if region_files:
+            offers[offer_code]["currentRegionIndexUrl"] = write_region_offers(output_dir, offer_code, products, seed)
+
+    index_path = os.path.join(output_dir, "offers", "v1.0", "aws", "index.json")
+    with open(index_path, "w") as index_file:
+        json.dump({"formatVersion": "v1.0", "offers": offers}, index_file, indent=2)
+    return index_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate deterministic synthetic AWS offer files.")
+    parser.add_argument("output_dir", help="Directory the offer index and files are written to")
+    parser.add_argument("--offers", default="AmazonS3,AmazonRDS", help="Comma separated offer codes")
+    parser.add_argument("--products", type=int, default=10000, help="Number of products per offer")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generator")
+    parser.add_argument("--region-files", action="store_true", help="Also write a region index and an offer file per region")
+    args = parser.parse_args()
+
+    index_path = generate_offers(args.output_dir, [code.strip() for code in args.offers.split(",")], args.products, args.seed,
+                                 args.region_files)
+    print(f"Offer index written to '{index_path}'.")
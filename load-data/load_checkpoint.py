@@ -0,0 +1,31 @@
+# Function to get the checkpoint of an offer as (version_url, record_count, first_sku, last_sku, completed), None if it was never loaded
+def get_checkpoint(cursor, offer_name):
+    cursor.execute(
+        "SELECT version_url, record_count, first_sku, last_sku, completed FROM load_checkpoint WHERE offer_name = %s",
+        (offer_name,),
+    )
+    return cursor.fetchone()
+
+
+# Function to record the records of an offer written so far, it is committed in the same transaction as the rows
+# so that the checkpoint never runs ahead of or behind the data
+def save_checkpoint(cursor, offer_name, version_url, record_count, first_sku, last_sku, completed=False):
+    cursor.execute(
+        """
+        INSERT INTO load_checkpoint (offer_name, version_url, record_count, first_sku, last_sku, completed)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE version_url = VALUES(version_url), record_count = VALUES(record_count),
+            first_sku = VALUES(first_sku), last_sku = VALUES(last_sku), completed = VALUES(completed)
+    """,
+        (offer_name, version_url, record_count, first_sku, last_sku, completed),
+    )
+
+
+# Function to delete the rows an interrupted load of an offer left behind
+def delete_offer_rows(cursor, offer_name):
+    cursor.execute(
+        "DELETE a FROM product_attribute a JOIN product p ON p.id = a.product_id WHERE p.offer_name = %s", (offer_name,)
+    )
+    cursor.execute("DELETE pr FROM price pr JOIN product p ON p.id = pr.product_id WHERE p.offer_name = %s", (offer_name,))
+    cursor.execute("DELETE FROM product WHERE offer_name = %s", (offer_name,))
+    return cursor.rowcount
@@ -0,0 +1,103 @@
+import cProfile
+import os
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from decouple import config
+
+try:
+    import resource
+except ImportError:
+    # The resource module only exists on Unix
+    resource = None
+
+# Stages the time of an offer load is split into
+STAGES = ["download", "parse", "transform", "insert", "commit"]
+
+# Seconds between two progress lines of an offer
+PROGRESS_INTERVAL = config("LOADER_PROGRESS_INTERVAL", default=5, cast=float)
+
+
+# Function to get the peak resident set size the current process reached so far in MB, it includes the offers
+# loaded before by the same process
+def process_peak_rss_mb():
+    if resource is None:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return round(peak_rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 2)
+
+
+# Function to enter a stage of a profile that may not be given
+def stage(profile, name):
+    return profile.stage(name) if profile is not None else nullcontext()
+
+
+# Time spent in each stage of an offer load, nested stages pause the stage they are entered from
+class LoadProfile:
+    def __init__(self, offer_name):
+        self.offer_name = offer_name
+        self.stages = dict.fromkeys(STAGES, 0.0)
+        self.active = []
+        self.mark = None
+        self.bytes_read = 0
+        self.records = 0
+        self.start_time = time.perf_counter()
+        self.last_progress = self.start_time
+
+    @contextmanager
+    def stage(self, name):
+        self.switch()
+        self.active.append(name)
+        try:
+            yield
+        finally:
+            self.switch()
+            self.active.pop()
+
+    # Charge the time since the last switch to the innermost active stage
+    def switch(self):
+        now = time.perf_counter()
+        if self.active:
+            self.stages[self.active[-1]] += now - self.mark
+        self.mark = now
+
+    # Count a record and print the progress of the offer every PROGRESS_INTERVAL seconds
+    def record_done(self, row_count):
+        self.records += 1
+        now = time.perf_counter()
+        if PROGRESS_INTERVAL and now - self.last_progress >= PROGRESS_INTERVAL:
+            self.last_progress = now
+            elapsed = now - self.start_time
+            print(
+                f"'{self.offer_name}': {self.records} records read, {row_count} rows written, "
+                f"{round(row_count / elapsed, 2)} rows/sec."
+            )
+
+    def report(self, row_count):
+        elapsed = time.perf_counter() - self.start_time
+        read_time = self.stages["download"] + self.stages["parse"]
+        return {
+            "elapsed_sec": round(elapsed, 4),
+            "stages_sec": {name: round(seconds, 4) for name, seconds in self.stages.items()},
+            "bytes_read": self.bytes_read,
+            "bytes_per_sec": round(self.bytes_read / read_time, 2) if read_time else 0.0,
+            "records": self.records,
+            "rows_per_sec": round(row_count / elapsed, 2) if elapsed else 0.0,
+            "insert_rows_per_sec": round(row_count / self.stages["insert"], 2) if self.stages["insert"] else 0.0,
+            "process_peak_rss_mb": process_peak_rss_mb(),
+        }
+
+
+# Function to run a call under cProfile and dump its statistics to a file in profile_dir
+def run_profiled(profile_dir, name, function, *args, **kwargs):
+    if not profile_dir:
+        return function(*args, **kwargs)
+    os.makedirs(profile_dir, exist_ok=True)
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function, *args, **kwargs)
+    finally:
+        profile_path = os.path.join(profile_dir, f"{name}.prof")
+        profiler.dump_stats(profile_path)
+        print(f"Profile of '{name}' written to '{profile_path}'.")
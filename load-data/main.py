@@ -1,78 +1,234 @@
-import json
+import argparse
 import mysql.connector
 import sys
+import time
 from decouple import config
+from attribute_stats import collect_attribute_stats
+from benchmark_utils import write_results
 from create_database import create_database_and_tables
-from process_offer import process_offer
-
-# Check if a JSON file name was provided as a command-line argument
-if len(sys.argv) != 2:
-    print("Usage: python script.py <json_file_name>")
-    sys.exit(1)
-
-json_file_name = sys.argv[1]
-
-# Load the JSON file
-try:
-    with open(json_file_name, "r") as json_file:
-        data = json.load(json_file)
-except FileNotFoundError:
-    print(f"Error: File '{json_file_name}' not found.")
-    sys.exit(1)
-
-# Define a list of offer names to process
-offer_names_to_process = config(
-    "OFFER_NAMES_TO_PROCESS", cast=lambda v: [s.strip() for s in v.split(",")]
-)
-
-
-# Define MySQL database connection parameters
-db_config = {
-    "host": config("DB_HOST"),
-    "user": config("DB_USER"),
-    "password": config("DB_PASSWORD"),
-}
-
-# Create a MySQL database connection
-try:
-    connection = mysql.connector.connect(**db_config)
-    cursor = connection.cursor()
-
-    # collect all the average query times for all offers
-    avg_query_times = []
-
-    print("MySQL connection established.")
-    print("Creating database and tables...")
-    create_database_and_tables(cursor)
-    print("Database and tables created.")
-
-    print("Processing offers...")
-    # Iterate over the offers in the JSON data
-    if offer_names_to_process == ["*"]:
-        for offer_name, offer_details in data["offers"].items():
-            avg_query_times.append(process_offer(offer_name, offer_details, cursor))
-    else:
-        for offer_name in offer_names_to_process:
-            if offer_name in data["offers"]:
-                avg_query_times.append(
-                    process_offer(offer_name, data["offers"][offer_name], cursor)
-                )
-            else:
-                print(f"Offer '{offer_name}' not found in JSON data.")
-
-    # Commit changes and close the database connection
-    connection.commit()
-
-    print("Successfully processed all offers.")
-    print(
-        f"Average query execution time for all the offers: {round(sum(avg_query_times) / len(avg_query_times), 2)} ms."
+from offer_cache import OfferCache, OfferCacheMiss
+from loader_profile import STAGES, run_profiled
+from offer_reader import load_offer_index
+from offer_versions import bump_data_version
+from parallel_loader import load_offers_parallel
+from price_comparison import build_price_comparison
+from process_offer import COMMIT_INTERVAL, process_offer
+
+
+def main():
+    # Parse the command-line arguments
+    parser = argparse.ArgumentParser(description="Load AWS offer files into the database.")
+    parser.add_argument("json_file_name", help="Offer index file, either a local path or a URL")
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        default=config("OFFER_STREAMING", default=False, cast=bool),
+        help="Spool offer files to disk and parse them incrementally instead of loading them into memory",
+    )
+    parser.add_argument(
+        "--insert-mode",
+        choices=["row", "bulk", "infile"],
+        default=config("INSERT_MODE", default="row"),
+        help="Insert rows one by one, in executemany chunks, or through LOAD DATA LOCAL INFILE",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Load the offer files from the offer cache without any network access",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Skip offers whose version is already loaded and apply only the changed SKUs of the others",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=config("LOADER_WORKERS", default=1, cast=int),
+        help="Number of worker processes loading offers in parallel",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=config("INSERT_CHUNK_SIZE", default=5000, cast=int),
+        help="Number of products buffered per chunk in the bulk and infile insert modes",
+    )
+    parser.add_argument(
+        "--commit-interval",
+        type=int,
+        default=COMMIT_INTERVAL,
+        help="Number of rows written between two commits of an offer, 0 commits every offer once",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Skip the offers completed by a previous run and continue the interrupted ones from their checkpoint",
+    )
+    parser.add_argument("--report", help="Write the per-offer stage timings and throughput as JSON to this file")
+    parser.add_argument(
+        "--profile",
+        metavar="PROFILE_DIR",
+        help="Run every offer under cProfile and write its statistics to PROFILE_DIR/<offer>.prof",
+    )
+    args = parser.parse_args()
+
+    json_file_name = args.json_file_name
+
+    # Directory used for spooled offer files in streaming mode
+    spool_dir = config("OFFER_SPOOL_DIR", default="", cast=lambda v: v or None)
+
+    # Local cache of the downloaded offer and index files
+    cache_dir = config("OFFER_CACHE_DIR", default="")
+    if args.offline and not cache_dir:
+        print("Error: OFFER_CACHE_DIR must be set to load offers offline.")
+        sys.exit(1)
+    cache = OfferCache(cache_dir, offline=args.offline) if cache_dir else None
+
+    # Load the offers of the JSON index file
+    try:
+        offers = load_offer_index(json_file_name, stream=args.stream, cache=cache)
+    except OfferCacheMiss as error:
+        print(f"Error: {error}")
+        sys.exit(1)
+    except FileNotFoundError:
+        print(f"Error: File '{json_file_name}' not found.")
+        sys.exit(1)
+
+    # Define a list of offer names to process
+    offer_names_to_process = config(
+        "OFFER_NAMES_TO_PROCESS", cast=lambda v: [s.strip() for s in v.split(",")]
     )
 
-except mysql.connector.Error as error:
-    print(f"Error: {error}")
+    # Regions whose offer files are loaded instead of the offer files covering every region, all of them when empty
+    regions_to_process = config(
+        "REGIONS_TO_PROCESS", default="", cast=lambda v: [s.strip() for s in v.split(",") if s.strip()]
+    )
+
+    # Define MySQL database connection parameters
+    db_config = {
+        "host": config("DB_HOST"),
+        "user": config("DB_USER"),
+        "password": config("DB_PASSWORD"),
+        "allow_local_infile": args.insert_mode == "infile",
+    }
+
+    # Create a MySQL database connection
+    connection = None
+    try:
+        connection = mysql.connector.connect(**db_config)
+        cursor = connection.cursor()
+
+        print("MySQL connection established.")
+        print("Creating database and tables...")
+        create_database_and_tables(cursor)
+        connection.commit()
+        print("Database and tables created.")
+
+        # Select the offers to process from the JSON data
+        if offer_names_to_process == ["*"]:
+            selected_offers = offers
+        else:
+            selected_offers = {}
+            for offer_name in offer_names_to_process:
+                if offer_name in offers:
+                    selected_offers[offer_name] = offers[offer_name]
+                else:
+                    print(f"Offer '{offer_name}' not found in JSON data.")
+
+        print("Processing offers...")
+        load_start_time = time.time()
+        offer_options = {
+            "stream": args.stream,
+            "spool_dir": spool_dir,
+            "insert_mode": args.insert_mode,
+            "chunk_size": args.chunk_size,
+            "refresh": args.refresh,
+            "cache": cache,
+            "resume": args.resume,
+            "commit_interval": args.commit_interval,
+            "regions": regions_to_process,
+        }
+        if args.workers > 1:
+            # Each worker loads whole offers on its own connection and commits them
+            offer_stats, failures = load_offers_parallel(selected_offers, db_config, args.workers, offer_options, args.profile)
+        else:
+            # Every offer is committed as soon as it is written, a failure stops the load
+            failures = []
+            offer_stats = [
+                run_profiled(args.profile, offer_name, process_offer, offer_name, offer_details, cursor,
+                             connection=connection, **offer_options)
+                for offer_name, offer_details in selected_offers.items()
+            ]
+
+        # Rebuild the attribute statistics used by the API query planner, a resumed run also rebuilds them for the
+        # offers completed by the interrupted run, which may have stopped before getting here
+        loaded_offers = [stats["offer_name"] for stats in offer_stats if args.resume or not stats["skipped"]]
+        if loaded_offers:
+            print("Collecting attribute statistics...")
+            print(f"Collected statistics of {collect_attribute_stats(cursor)} attribute values.")
+
+            # Rebuild the cross-region price comparison of the loaded offers
+            print("Building the price comparison...")
+            print(f"Ranked the prices of {build_price_comparison(cursor, loaded_offers)} products across regions.")
+
+            # The offers were committed before the comparison was rebuilt, bump the version again so the API
+            # drops the responses cached in between
+            bump_data_version(cursor)
+
+        # Commit changes and close the database connection
+        connection.commit()
+        load_time = time.time() - load_start_time
+
+        if failures:
+            print(f"Failed to load {len(failures)} offers: {', '.join(failure['offer_name'] for failure in failures)}.")
+        else:
+            print("Successfully processed all offers.")
+        skipped_offers = [stats["offer_name"] for stats in offer_stats if stats["skipped"]]
+        if skipped_offers:
+            print(f"Skipped {len(skipped_offers)} up to date offers: {', '.join(skipped_offers)}.")
+        loaded_stats = [stats for stats in offer_stats if not stats["skipped"]]
+        if loaded_stats:
+            stage_totals = {
+                name: round(sum(stats["stages_sec"][name] for stats in loaded_stats), 2) for name in STAGES
+            }
+            stages = ", ".join(f"{name} {seconds} s" for name, seconds in stage_totals.items())
+            print(f"Time spent per stage across all the offers: {stages}.")
+            row_count = sum(stats["row_count"] for stats in loaded_stats)
+            print(f"Wrote {row_count} rows at {round(row_count / load_time, 2)} rows/sec overall.")
+            peak_rss = [stats["process_peak_rss_mb"] for stats in loaded_stats if stats["process_peak_rss_mb"] is not None]
+            if peak_rss:
+                print(f"Peak RSS of a loader process: {max(peak_rss)} MB.")
+            print(f"Loaded {len(loaded_stats)} offers in {round(load_time, 2)} s with {args.workers} worker(s).")
+
+        if args.report:
+            parameters = {
+                "index": json_file_name,
+                "stream": args.stream,
+                "insert_mode": args.insert_mode,
+                "chunk_size": args.chunk_size,
+                "workers": args.workers,
+                "refresh": args.refresh,
+                "commit_interval": args.commit_interval,
+                "resume": args.resume,
+                "regions": regions_to_process,
+                "load_time_sec": round(load_time, 4),
+            }
+            # The failed offers are listed with their error next to the stats of the loaded ones
+            write_results(args.report, "load", parameters,
+                          offer_stats + [{**failure, "failed": True} for failure in failures])
+
+        if failures:
+            sys.exit(1)
+
+    except mysql.connector.Error as error:
+        print(f"Error: {error}")
+
+    finally:
+        if connection and connection.is_connected():
+            cursor.close()
+            connection.close()
+            print("MySQL connection is closed.")
+
 
-finally:
-    if connection.is_connected():
-        cursor.close()
-        connection.close()
-        print("MySQL connection is closed.")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import tempfile
+from offer_reader import DOWNLOAD_CHUNK_SIZE, http_session
+
+
+class OfferCacheMiss(Exception):
+    pass
+
+
+# Content-addressed cache of downloaded offer and index files
+#
+# Layout of the cache directory:
+#   objects/<sha256>        file contents, named by their SHA-256 digest
+#   urls/<url hash>.json    URL metadata: digest, ETag and Last-Modified
+#   partial/<url hash>      incomplete download, resumed with a Range request
+#   partial/<url hash>.json validator of the incomplete download used for If-Range
+class OfferCache:
+    def __init__(self, cache_dir, offline=False):
+        self.cache_dir = cache_dir
+        self.offline = offline
+        for sub_dir in ("objects", "urls", "partial"):
+            os.makedirs(os.path.join(cache_dir, sub_dir), exist_ok=True)
+
+    def url_key(self, url):
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def object_path(self, digest):
+        return os.path.join(self.cache_dir, "objects", digest)
+
+    def read_json(self, path):
+        try:
+            with open(path, "r") as json_file:
+                return json.load(json_file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def write_json(self, path, data):
+        # Write to a temporary file first so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "w") as json_file:
+            json.dump(data, json_file)
+        os.replace(tmp_path, path)
+
+    # Function to get the cached metadata of a URL if its object is still present
+    def lookup(self, url):
+        metadata = self.read_json(os.path.join(self.cache_dir, "urls", self.url_key(url) + ".json"))
+        if metadata and os.path.exists(self.object_path(metadata["sha256"])):
+            return metadata
+        return None
+
+    # Function to return the local path of a URL, downloading it only if it changed
+    def fetch(self, url):
+        metadata = self.lookup(url)
+        if self.offline:
+            if not metadata:
+                raise OfferCacheMiss(f"'{url}' is not in the offer cache")
+            return self.object_path(metadata["sha256"])
+
+        # Ask the server to send the file only if it changed since it was cached, without
+        # content encoding so that byte offsets of partial downloads stay valid
+        headers = {"Accept-Encoding": "identity"}
+        if metadata and metadata.get("etag"):
+            headers["If-None-Match"] = metadata["etag"]
+        if metadata and metadata.get("last_modified"):
+            headers["If-Modified-Since"] = metadata["last_modified"]
+
+        key = self.url_key(url)
+        partial_path = os.path.join(self.cache_dir, "partial", key)
+        partial_metadata_path = partial_path + ".json"
+        partial_metadata = self.read_json(partial_metadata_path)
+        offset = os.path.getsize(partial_path) if os.path.exists(partial_path) and partial_metadata else 0
+        if offset:
+            # Resume the partial download, the server sends the whole file again if it changed
+            headers["Range"] = f"bytes={offset}-"
+            validator = partial_metadata.get("etag") or partial_metadata.get("last_modified")
+            if validator:
+                headers["If-Range"] = validator
+
+        with http_session.get(url, headers=headers, stream=True) as response:
+            if response.status_code == 304 and metadata:
+                return self.object_path(metadata["sha256"])
+            response.raise_for_status()
+
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            digest = hashlib.sha256()
+            if response.status_code == 206 and offset:
+                # Hash the bytes downloaded earlier before appending the rest
+                with open(partial_path, "rb") as partial_file:
+                    for chunk in iter(lambda: partial_file.read(DOWNLOAD_CHUNK_SIZE), b""):
+                        digest.update(chunk)
+                mode = "ab"
+            else:
+                mode = "wb"
+                self.write_json(partial_metadata_path, {"url": url, "etag": etag, "last_modified": last_modified})
+
+            with open(partial_path, mode) as partial_file:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    partial_file.write(chunk)
+                    digest.update(chunk)
+
+        sha256 = digest.hexdigest()
+        os.replace(partial_path, self.object_path(sha256))
+        os.remove(partial_metadata_path)
+        self.write_json(
+            os.path.join(self.cache_dir, "urls", key + ".json"),
+            {"url": url, "sha256": sha256, "etag": etag, "last_modified": last_modified},
+        )
+        return self.object_path(sha256)
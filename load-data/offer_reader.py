@@ -0,0 +1,160 @@
+import json
+import os
+import sqlite3
+import tempfile
+import ijson
+import requests
+from decouple import config
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from loader_profile import stage
+
+# Base URL of the AWS bulk price API, can point to a local stand-in server
+PRICING_BASE_URL = config("PRICING_BASE_URL", default="https://pricing.us-east-1.amazonaws.com")
+
+# Size of the chunks written to disk while spooling an offer file
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Number of times a failed download is retried, with an exponential backoff
+DOWNLOAD_RETRIES = config("DOWNLOAD_RETRIES", default=5, cast=int)
+
+# HTTP session retrying connection errors and transient server errors, so a network blip doesn't fail a long load
+http_session = requests.Session()
+http_session.mount("https://", HTTPAdapter(max_retries=Retry(total=DOWNLOAD_RETRIES, backoff_factor=1,
+                                                             status_forcelist=(429, 500, 502, 503, 504))))
+http_session.mount("http://", http_session.get_adapter("https://"))
+
+
+# Function to build a product/price record from the raw offer JSON entries, products without a region code
+# get the region of the offer file they come from
+def build_record(product_details, term_details, region_code=""):
+    attributes = product_details.get("attributes", {})
+
+    # Pick the first price dimension of the first OnDemand term, if any
+    price_info = {}
+    if term_details:
+        price_dimensions = next(iter(term_details.values()), {}).get("priceDimensions", {})
+        price_info = next(iter(price_dimensions.values()), {})
+
+    return {
+        "product_family": product_details.get("productFamily", "") or "Unknown",
+        "sku": product_details.get("sku", ""),
+        "service_code": attributes.get("servicecode", ""),
+        "location": attributes.get("location", attributes.get("fromLocation", "")),
+        "region_code": attributes.get("regionCode", attributes.get("fromRegionCode", region_code)),
+        "attributes": attributes,
+        "price": {
+            "pricePerUnit": price_info.get("pricePerUnit", {}).get("USD", 0.0),
+            "unit": price_info.get("unit", ""),
+            "description": price_info.get("description", ""),
+        },
+    }
+
+
+# Function to download an offer file into memory
+def download_offer(current_version_url):
+    response = http_session.get(PRICING_BASE_URL + current_version_url)
+    response.raise_for_status()
+    return response.content
+
+
+# Generator yielding records from an offer held entirely in memory
+def read_offer_in_memory(current_version_url, cache=None, profile=None):
+    with stage(profile, "download"):
+        if cache:
+            offer_path = cache.fetch(PRICING_BASE_URL + current_version_url)
+            size = os.path.getsize(offer_path)
+        else:
+            content = download_offer(current_version_url)
+            size = len(content)
+    if profile is not None:
+        profile.bytes_read += size
+
+    with stage(profile, "parse"):
+        if cache:
+            with open(offer_path, "r") as offer_file:
+                offer_data = json.load(offer_file)
+        else:
+            offer_data = json.loads(content)
+    yield from read_offer_data(offer_data, profile)
+
+
+# Generator yielding records from the parsed JSON data of an offer
+def read_offer_data(offer_data, profile=None, region_code=""):
+    on_demand_terms = offer_data.get("terms", {}).get("OnDemand", {})
+    for product_sku, product_details in offer_data.get("products", {}).items():
+        with stage(profile, "transform"):
+            record = build_record(product_details, on_demand_terms.get(product_sku, {}), region_code)
+        yield record
+
+
+# Function to download an offer file to disk without holding it in memory
+def spool_offer(current_version_url, spool_dir=None):
+    fd, path = tempfile.mkstemp(suffix=".json", dir=spool_dir)
+    try:
+        with http_session.get(PRICING_BASE_URL + current_version_url, stream=True) as response:
+            response.raise_for_status()
+            with os.fdopen(fd, "wb") as spool_file:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    spool_file.write(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+# Generator yielding (key, value) pairs of a JSON object at the given prefix
+def iter_json_object(path, prefix):
+    with open(path, "rb") as json_file:
+        yield from ijson.kvitems(json_file, prefix, use_float=True)
+
+
+# Generator yielding records from an offer file on disk
+def read_offer_streaming(offer_path, spool_dir=None, profile=None, region_code=""):
+    # The OnDemand terms are spilled to a temporary SQLite table keyed by SKU so
+    # that products can be joined to their terms without loading either section
+    fd, join_path = tempfile.mkstemp(suffix=".sqlite", dir=spool_dir)
+    os.close(fd)
+    join_db = sqlite3.connect(join_path)
+    try:
+        join_db.execute("CREATE TABLE terms (sku TEXT PRIMARY KEY, details TEXT)")
+        join_db.executemany(
+            "INSERT OR IGNORE INTO terms (sku, details) VALUES (?, ?)",
+            ((sku, json.dumps(details)) for sku, details in iter_json_object(offer_path, "terms.OnDemand")),
+        )
+        join_db.commit()
+
+        for product_sku, product_details in iter_json_object(offer_path, "products"):
+            row = join_db.execute("SELECT details FROM terms WHERE sku = ?", (product_sku,)).fetchone()
+            with stage(profile, "transform"):
+                record = build_record(product_details, json.loads(row[0]) if row else {}, region_code)
+            yield record
+    finally:
+        join_db.close()
+        os.remove(join_path)
+
+
+# Function to load the offers section of the offer index file
+def load_offer_index(index_path, stream=False, cache=None):
+    # Index files given by URL are downloaded through the offer cache
+    if index_path.startswith(("http://", "https://")):
+        if cache:
+            index_path = cache.fetch(index_path)
+        else:
+            response = http_session.get(index_path)
+            response.raise_for_status()
+            return response.json()["offers"]
+    if stream:
+        return dict(iter_json_object(index_path, "offers"))
+    with open(index_path, "r") as index_file:
+        return json.load(index_file)["offers"]
+
+
+# Function to load the regions section of the region index of an offer, which points to the offer file of every region
+def load_region_index(region_index_url, cache=None):
+    if cache:
+        with open(cache.fetch(PRICING_BASE_URL + region_index_url), "r") as index_file:
+            return json.load(index_file)["regions"]
+    response = http_session.get(PRICING_BASE_URL + region_index_url)
+    response.raise_for_status()
+    return response.json()["regions"]
@@ -0,0 +1,21 @@
+# Function to get the version URL of the offer currently loaded in the database
+def get_loaded_version(cursor, offer_name):
+    cursor.execute("SELECT version_url FROM offer_version WHERE offer_name = %s", (offer_name,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+# Function to record the version URL of a loaded offer
+def save_loaded_version(cursor, offer_name, version_url):
+    cursor.execute(
+        """
+        INSERT INTO offer_version (offer_name, version_url) VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE version_url = VALUES(version_url)
+    """,
+        (offer_name, version_url),
+    )
+
+
+# Function to bump the data version read by the API to invalidate its caches
+def bump_data_version(cursor):
+    cursor.execute("UPDATE data_version SET version = version + 1 WHERE id = 1")
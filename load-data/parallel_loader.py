@@ -0,0 +1,41 @@
+import mysql.connector
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from loader_profile import run_profiled
+from process_offer import process_offer
+
+
+# Function run by a pool worker to load a single offer on its own connection
+def load_offer(offer_name, offer_details, db_config, offer_options, profile_dir=None):
+    connection = mysql.connector.connect(database="aws_database", **db_config)
+    dimension_connection = mysql.connector.connect(database="aws_database", autocommit=True, **db_config)
+    try:
+        cursor = connection.cursor()
+        dimension_cursor = dimension_connection.cursor()
+        # process_offer commits the offer on the connection it is given
+        return run_profiled(profile_dir, offer_name, process_offer, offer_name, offer_details, cursor,
+                            dimension_cursor=dimension_cursor, connection=connection, **offer_options)
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+        dimension_connection.close()
+
+
+# Function to load the offers in parallel across a pool of worker processes, returns the stats of the loaded offers
+# and the offers that failed with their error
+def load_offers_parallel(offers, db_config, workers, offer_options, profile_dir=None):
+    offer_stats = []
+    failures = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(load_offer, offer_name, offer_details, db_config, offer_options, profile_dir): offer_name
+            for offer_name, offer_details in offers.items()
+        }
+        for future in as_completed(futures):
+            try:
+                offer_stats.append(future.result())
+            except Exception as error:
+                print(f"Error: Failed to process offer '{futures[future]}': {error}")
+                failures.append({"name": futures[future], "offer_name": futures[future], "error": str(error)})
+    return offer_stats, failures
@@ -0,0 +1,40 @@
+# Attributes that differ between the regions of the same product, they are left out of its signature
+LOCATION_ATTRIBUTES = ("location", "locationType", "regionCode", "fromLocation", "fromLocationType", "fromRegionCode", "usagetype")
+
+# Region prefix of a usage type, e.g. 'USW2-' in 'USW2-BoxUsage:t3.micro' (us-east-1 usage types have none)
+USAGE_TYPE_REGION_PREFIX = "^[A-Z]{2,4}[0-9]*-"
+
+
+# Function to rebuild the cross-region price comparison rows of the given offers
+def build_price_comparison(cursor, offer_names):
+    removed_paths = ", ".join(f"'$.{name}'" for name in LOCATION_ATTRIBUTES)
+    row_count = 0
+    for offer_name in offer_names:
+        cursor.execute("DELETE FROM price_comparison WHERE offer_name = %s", (offer_name,))
+        # The signature hashes the service, family, normalized usage type, unit and the remaining attributes,
+        # MySQL stores JSON objects with sorted keys so equal attributes always serialize the same way.
+        # Products without an OnDemand price dimension are stored with an empty unit and are left out.
+        # Equal prices are ranked by region, so every signature has exactly one cheapest row.
+        cursor.execute(
+            f"""
+            INSERT INTO price_comparison (product_id, signature, offer_name, service_id, usage_type, region_id, location_id,
+                sku, price_per_unit, unit, price_rank, region_count)
+            SELECT product_id, signature, offer_name, service_id, usage_type, region_id, location_id, sku, price_per_unit, unit,
+                ROW_NUMBER() OVER (PARTITION BY signature ORDER BY price_per_unit, region_id, product_id),
+                COUNT(*) OVER (PARTITION BY signature)
+            FROM (
+                SELECT p.id AS product_id, p.offer_name, p.service_id, p.region_id, p.location_id, p.sku,
+                    pr.pricePerUnit AS price_per_unit, pr.unit,
+                    REGEXP_REPLACE(p.product_attributes->>'$.usagetype', '{USAGE_TYPE_REGION_PREFIX}', '') AS usage_type,
+                    SHA1(CONCAT_WS('|', p.service_id, p.product_family_id,
+                        REGEXP_REPLACE(p.product_attributes->>'$.usagetype', '{USAGE_TYPE_REGION_PREFIX}', ''), pr.unit,
+                        CAST(JSON_REMOVE(p.product_attributes, {removed_paths}) AS CHAR))) AS signature
+                FROM product p
+                JOIN price pr ON pr.product_id = p.id
+                WHERE p.offer_name = %s AND pr.unit <> ''
+            ) products
+        """,
+            (offer_name,),
+        )
+        row_count += cursor.rowcount
+    return row_count
@@ -1,117 +1,259 @@
-import requests
+import hashlib
 import json
-import time
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from decouple import config
+from bulk_writer import create_writer
+from delta_writer import DeltaWriter
+from load_checkpoint import delete_offer_rows, get_checkpoint, save_checkpoint
+from loader_profile import LoadProfile, stage
+from offer_reader import (PRICING_BASE_URL, download_offer, load_region_index, read_offer_data, read_offer_in_memory,
+                          read_offer_streaming, spool_offer)
+from offer_versions import bump_data_version, get_loaded_version, save_loaded_version
 
+# Number of rows written between two commits of an offer, 0 commits every offer once
+COMMIT_INTERVAL = config("LOADER_COMMIT_INTERVAL", default=100000, cast=int)
 
-# Function to process an offer
-def process_offer(offer_name, offer_details, cursor):
-    print(f"Processing offer '{offer_name}'...")
+# Number of region offer files of an offer downloaded at the same time
+REGION_FETCH_WORKERS = config("REGION_FETCH_WORKERS", default=4, cast=int)
+
+
+# Function to resolve the offer files of the given regions from the region index of an offer, as (region_code, version URL)
+# pairs sorted by region, None when the whole offer file has to be loaded
+def resolve_region_files(offer_name, offer_details, regions, cache=None):
+    if not regions or "currentRegionIndexUrl" not in offer_details:
+        return None
+    region_index = load_region_index(offer_details["currentRegionIndexUrl"], cache)
+    missing = [region_code for region_code in regions if region_code not in region_index]
+    if missing:
+        print(f"Offer '{offer_name}' has no offer file for the regions {', '.join(missing)}.")
+    return [(region_code, region_index[region_code]["currentVersionUrl"])
+            for region_code in sorted(set(regions) - set(missing))]
+
+
+# Function to get the version of a set of region offer files, it changes whenever one of them or the set of regions does
+def region_files_version(offer_details, region_files):
+    digest = hashlib.sha1("\n".join(f"{region_code} {url}" for region_code, url in region_files).encode("utf-8"))
+    return f"{offer_details['currentRegionIndexUrl']}#{digest.hexdigest()}"
+
+
+# Function to download a region offer file, to disk when streaming or through the offer cache, into memory otherwise
+def fetch_region_file(version_url, stream=False, spool_dir=None, cache=None):
+    if cache:
+        return cache.fetch(PRICING_BASE_URL + version_url)
+    if stream:
+        return spool_offer(version_url, spool_dir)
+    return download_offer(version_url)
+
+
+# Function to remove the file spooled by a region download that finished after its load stopped
+def remove_spooled_file(future):
+    if not future.cancelled() and future.exception() is None and os.path.exists(future.result()):
+        os.remove(future.result())
+
+
+# Generator yielding the records of the region offer files of an offer, the files are downloaded concurrently
+# and read one after the other in region order, so the records always come in the same order
+def read_region_files(offer_name, region_files, stream=False, spool_dir=None, cache=None, profile=None):
+    print(f"Downloading '{offer_name}' JSON data of {len(region_files)} regions...")
+    executor = ThreadPoolExecutor(max_workers=REGION_FETCH_WORKERS)
+    pending_files = iter(region_files)
+    downloads = deque()
+    # Spooled files are deleted once read, the cached ones are kept for the next run
+    spooled = stream and not cache
+
+    # Function to start the download of the next region file, so at most REGION_FETCH_WORKERS files are fetched ahead
+    def download_next():
+        for region_code, url in islice(pending_files, 1):
+            downloads.append((region_code, executor.submit(fetch_region_file, url, stream, spool_dir, cache)))
+
+    for _ in range(REGION_FETCH_WORKERS):
+        download_next()
+    try:
+        while downloads:
+            region_code, future = downloads.popleft()
+            # Only the time spent waiting for a file that is still downloading is charged to the download
+            with stage(profile, "download"):
+                fetched = future.result()
+            # The future would keep the file in memory until the end of the load
+            del future
+            download_next()
+
+            if isinstance(fetched, bytes):
+                if profile is not None:
+                    profile.bytes_read += len(fetched)
+                with stage(profile, "parse"):
+                    offer_data = json.loads(fetched)
+                del fetched
+                yield from read_offer_data(offer_data, profile, region_code)
+                continue
+
+            if profile is not None:
+                profile.bytes_read += os.path.getsize(fetched)
+            try:
+                if stream:
+                    yield from read_offer_streaming(fetched, spool_dir, profile, region_code)
+                else:
+                    with stage(profile, "parse"):
+                        with open(fetched, "r") as offer_file:
+                            offer_data = json.load(offer_file)
+                    yield from read_offer_data(offer_data, profile, region_code)
+            finally:
+                if spooled:
+                    os.remove(fetched)
+    finally:
+        # A failed or interrupted load doesn't wait for the downloads still running, their files are removed once spooled
+        executor.shutdown(wait=False, cancel_futures=True)
+        if spooled:
+            for _, future in downloads:
+                future.add_done_callback(remove_spooled_file)
+
+
+# Generator yielding the product/price records of an offer, only those of the given region offer files when there are some
+def read_offer(offer_name, offer_details, stream=False, spool_dir=None, cache=None, profile=None, region_files=None):
+    if region_files is not None:
+        yield from read_region_files(offer_name, region_files, stream, spool_dir, cache, profile)
+        return
 
     current_version_url = offer_details["currentVersionUrl"]
 
-    # Download the JSON data from the currentVersionUrl
-    print(f"Downloading '{offer_name}' JSON data...")
-    response = requests.get(
-        "https://pricing.us-east-1.amazonaws.com" + current_version_url
-    )
-    offer_data = response.json()
-    print(f"Loaded '{offer_name}' JSON data.")
+    if not stream:
+        # Download the JSON data from the currentVersionUrl and keep it in memory
+        print(f"Downloading '{offer_name}' JSON data...")
+        yield from read_offer_in_memory(current_version_url, cache, profile)
+        return
 
-    # Initialize variables to track the product family ID and name
-    product_family_ids = {}
+    if cache:
+        # Walk the cached JSON data, which is kept for the next run
+        print(f"Fetching '{offer_name}' JSON data from the offer cache...")
+        with stage(profile, "download"):
+            offer_path = cache.fetch(PRICING_BASE_URL + current_version_url)
+        if profile is not None:
+            profile.bytes_read += os.path.getsize(offer_path)
+        yield from read_offer_streaming(offer_path, spool_dir, profile)
+        return
 
-    # Start measuring time
-    start_time = time.time()
+    # Spool the JSON data to disk and walk it incrementally
+    print(f"Downloading '{offer_name}' JSON data to disk...")
+    with stage(profile, "download"):
+        offer_path = spool_offer(current_version_url, spool_dir)
+    if profile is not None:
+        profile.bytes_read += os.path.getsize(offer_path)
+    print(f"Downloaded '{offer_name}' JSON data.")
+    try:
+        yield from read_offer_streaming(offer_path, spool_dir, profile)
+    finally:
+        os.remove(offer_path)
 
-    # Start measuring no.of queries executed
-    query_count = 0
 
-    # Create the Unknown product family if it doesn't exist
-    cursor.execute("INSERT INTO product_family (name) VALUES (%s)", ("Unknown",))
-    unknown_product_family_id = cursor.lastrowid
-    product_family_ids["Unknown"] = unknown_product_family_id
-    query_count += 1
+# Function to process an offer, the connection is committed every commit_interval rows and once the offer
+# is written when it is given, with regions only their offer files are loaded
+def process_offer(offer_name, offer_details, cursor, stream=False, spool_dir=None, insert_mode="row", chunk_size=5000,
+                  refresh=False, cache=None, dimension_cursor=None, connection=None, resume=False,
+                  commit_interval=COMMIT_INTERVAL, regions=None):
+    print(f"Processing offer '{offer_name}' (pid {os.getpid()})...")
 
-    print("Inserting products and prices...")
-    # Iterate over the products in the offer data
-    for product_sku, product_details in offer_data.get("products", {}).items():
-        # Create the product family if doesn't exist and use the ID if it does
-        product_family_name = product_details.get("productFamily", "")
-        if not product_family_name:
-            product_family_name = "Unknown"
-        product_family_id = product_family_ids.get(product_family_name)
-
-        if (
-            not product_family_id
-            and product_family_name != ""
-            and product_family_name != "Unknown"
-        ):
-            # If it doesn't exist, create a new product family
-            cursor.execute(
-                "INSERT INTO product_family (name) VALUES (%s)", (product_family_name,)
-            )
-            product_family_id = cursor.lastrowid
-            product_family_ids[product_family_name] = product_family_id
-            query_count += 1
-
-        # Insert data into the 'product' table
-        cursor.execute(
-            """
-            INSERT INTO product (product_family_id, sku, service_code, location, region_code, product_attributes)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """,
-            (
-                product_family_id,
-                product_details.get("sku", ""),
-                product_details.get("attributes", {}).get("servicecode", ""),
-                product_details.get("attributes", {}).get(
-                    "location",
-                    product_details.get("attributes", {}).get("fromLocation", ""),
-                ),
-                product_details.get("attributes", {}).get(
-                    "regionCode",
-                    product_details.get("attributes", {}).get("fromRegionCode", ""),
-                ),
-                json.dumps(
-                    product_details.get("attributes", {})
-                ),  # Entire product_details as JSON
-            ),
-        )
+    # The version of a region-scoped load covers the offer files of all its regions
+    region_files = resolve_region_files(offer_name, offer_details, regions, cache)
+    if region_files is None:
+        current_version_url = offer_details["currentVersionUrl"]
+    else:
+        current_version_url = region_files_version(offer_details, region_files)
+    if refresh and get_loaded_version(cursor, offer_name) == current_version_url:
+        print(f"Offer '{offer_name}' is up to date, skipping.")
+        return {"name": offer_name, "offer_name": offer_name, "row_count": 0, "skipped": True}
 
-        last_added_product_id = cursor.lastrowid
-        query_count += 1
+    # Refreshes are applied in a single transaction and simply start over after a failure
+    checkpoint = None if refresh else get_checkpoint(cursor, offer_name)
+    resume_from, first_sku, last_sku = 0, None, None
+    if checkpoint and not checkpoint[4]:
+        if resume and checkpoint[0] == current_version_url:
+            resume_from, first_sku, last_sku = checkpoint[1], checkpoint[2], checkpoint[3]
+        else:
+            # The rows of an interrupted load are deleted so that the offer is not loaded twice
+            print(f"Deleted {delete_offer_rows(cursor, offer_name)} products of an interrupted load of '{offer_name}'.")
+    elif checkpoint and resume and checkpoint[0] == current_version_url:
+        print(f"Offer '{offer_name}' was completed by a previous run, skipping.")
+        return {"name": offer_name, "offer_name": offer_name, "row_count": 0, "skipped": True}
 
-        # Insert data into the 'price' table
-        term_details = (
-            offer_data.get("terms", {}).get("OnDemand", {}).get(product_sku, {})
-        )
-        price_dimensions = term_details.get(list(term_details.keys())[0], {}).get(
-            "priceDimensions", {}
-        )
-        price_info = price_dimensions.get(list(price_dimensions.keys())[0], {})
-        cursor.execute(
-            """
-            INSERT INTO price (product_id, pricePerUnit, unit, description)
-            VALUES (%s, %s, %s, %s)
-        """,
-            (
-                last_added_product_id,  # Last inserted product_id
-                price_info.get("pricePerUnit", {}).get("USD", 0.0),
-                price_info.get("unit", ""),
-                price_info.get("description", ""),
-            ),
-        )
-        query_count += 1
+    profile = LoadProfile(offer_name)
+    records = read_offer(offer_name, offer_details, stream, spool_dir, cache, profile, region_files)
+    if refresh:
+        # Stage the offer and apply only the SKUs that changed
+        writer = DeltaWriter(offer_name, cursor, chunk_size, dimension_cursor)
+    else:
+        writer = create_writer(insert_mode, offer_name, cursor, chunk_size, spool_dir, dimension_cursor)
+
+    if resume_from:
+        # The offer file of a version never changes, so its first records are the ones already committed
+        print(f"Resuming offer '{offer_name}' after {resume_from} records (SKUs '{first_sku}' to '{last_sku}')...")
+        record = None
+        with profile.stage("parse"):
+            for record in islice(records, resume_from):
+                pass
+        if record is None or record["sku"] != last_sku:
+            raise ValueError(f"The records of '{offer_name}' don't match its checkpoint, load it again without --resume")
+
+    print("Inserting products and prices...")
+    # Iterate over the products in the offer data, the time spent in the reader that is
+    # not charged to its download and transform stages is parsing
+    record_count = resume_from
+    committed_rows = 0
+    while True:
+        with profile.stage("parse"):
+            record = next(records, None)
+        if record is None:
+            break
+        with profile.stage("insert"):
+            writer.write(record)
+        record_count += 1
+        first_sku = first_sku if first_sku is not None else record["sku"]
+        last_sku = record["sku"]
+        profile.record_done(writer.row_count)
 
-    # Stop measuring time
-    end_time = time.time()
+        # Commit the rows written so far with their checkpoint, the delta of a refresh is only applied by its flush
+        if connection is not None and commit_interval and not refresh and writer.row_count - committed_rows >= commit_interval:
+            with profile.stage("insert"):
+                writer.flush()
+                save_checkpoint(cursor, offer_name, current_version_url, record_count, first_sku, last_sku)
+                # Every commit makes new rows visible, so the API has to drop what it cached of the previous ones,
+                # the version row is updated last to hold its lock only until the commit
+                bump_data_version(cursor)
+            with profile.stage("commit"):
+                connection.commit()
+            committed_rows = writer.row_count
+    with profile.stage("insert"):
+        writer.flush()
+        save_checkpoint(cursor, offer_name, current_version_url, record_count, first_sku, last_sku, completed=True)
+        save_loaded_version(cursor, offer_name, current_version_url)
+        # Bumped in the same transaction as the data so the API sees both at once
+        bump_data_version(cursor)
+    if connection is not None:
+        with profile.stage("commit"):
+            connection.commit()
 
-    # Print the time taken to process the offer
-    avg_query_time = (end_time - start_time) * 1000 / query_count
+    report = profile.report(writer.row_count)
+    stages = ", ".join(f"{name} {seconds} s" for name, seconds in report["stages_sec"].items())
+    print(f"Stages of the offer '{offer_name}': {stages}.")
+    if refresh:
+        print(
+            f"Refreshed the offer '{offer_name}': {writer.inserted} products inserted, "
+            f"{writer.updated} rows updated, {writer.deleted} products deleted."
+        )
     print(
-        f"Average query execution time for the offer '{offer_name}': {round(avg_query_time, 2)} ms."
+        f"Wrote {writer.row_count} rows for the offer '{offer_name}' at {report['rows_per_sec']} rows/sec "
+        f"({report['insert_rows_per_sec']} rows/sec while inserting), read {report['bytes_read']} bytes at "
+        f"{report['bytes_per_sec']} bytes/sec, peak RSS of the process so far {report['process_peak_rss_mb']} MB."
     )
-
     print(f"Offer '{offer_name}' processed.")
 
-    return avg_query_time
+    return {
+        "name": offer_name,
+        "offer_name": offer_name,
+        "row_count": writer.row_count,
+        "query_count": writer.query_count,
+        "skipped": False,
+        **report,
+    }
@@ -1,62 +1,42 @@
+import argparse
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 from decouple import config
-import time
 from tabulate import tabulate
-
-# Replace with your database URL
-DATABASE_URL = f"mysql+mysqlconnector://{config('DB_USER')}:{config('DB_PASSWORD')}@{config('DB_HOST')}/{config('DB_NAME')}"
-
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-# Create a list to store query results
-query_results = []
-
-
-def measure_query_execution_time(query_description, query, parameters=None):
-    session = SessionLocal()
-    try:
-        start_time = time.time()
-        result = (
-            session.execute(query, parameters) if parameters else session.execute(query)
-        )
-        end_time = time.time()
-        execution_time = end_time - start_time
-        rows = result.fetchall()
-        num_rows = len(rows)
-        query_results.append(
-            (query_description, round(execution_time * 1000, 4), num_rows)
-        )
-        return rows  # Return rows instead of result
-    finally:
-        session.close()
-
+from benchmark_utils import Timer, summarize_latencies, write_results
 
 # Query 1: Know all product families
 query_1 = text("SELECT * FROM product_family")
-result_1 = measure_query_execution_time("Know all product families", query_1)
 
 # Query 2: Know all the services under a product family
-query_2 = text("SELECT DISTINCT service_code FROM product")
-result_2 = measure_query_execution_time(
-    "Know all the services under a product family", query_2
-)
+query_2 = text("SELECT DISTINCT s.code FROM product p JOIN service s ON s.id = p.service_id")
 
 # Query 3: Know all the services available in a region
-query_3 = text("SELECT DISTINCT service_code FROM product WHERE region_code = :region")
-result_3 = measure_query_execution_time(
-    "Know all the services available in a region", query_3, {"region": "us-east-1"}
+query_3 = text(
+    """
+    SELECT DISTINCT s.code
+    FROM region r
+    JOIN
+        product p ON p.region_id = r.id
+    JOIN
+        service s ON s.id = p.service_id
+    WHERE r.code = :region
+"""
 )
 
 # Query 4: Know all the products of a particular service (e.g., Amazon S3)
 query_4 = text(
-    "SELECT p.id, p.product_family_id, p.sku, p.location, p.region_code FROM product p WHERE service_code = :service_code"
-)
-result_4 = measure_query_execution_time(
-    "Know all the products of a particular service",
-    query_4,
-    {"service_code": "AmazonS3"},
+    """
+    SELECT p.id, p.product_family_id, p.sku, l.name AS location, r.code AS region_code
+    FROM service s
+    JOIN
+        product p ON p.service_id = s.id
+    JOIN
+        location l ON l.id = p.location_id
+    JOIN
+        region r ON r.id = p.region_id
+    WHERE s.code = :service_code
+"""
 )
 
 # Query 5: Know the price in different regions of a particular service
@@ -65,49 +45,138 @@ query_5 = text(
     SELECT
     p.id AS id,
     p.sku AS sku,
-    p.location AS location,
-    p.region_code AS region_code,
+    l.name AS location,
+    r.code AS region_code,
     pr.pricePerUnit AS price,
     pr.unit AS unit
     FROM
-        product p
+        service s
+    JOIN
+        product p ON p.service_id = s.id
+    JOIN
+        location l ON l.id = p.location_id
+    JOIN
+        region r ON r.id = p.region_id
     JOIN
         price pr ON p.id = pr.product_id
     WHERE
-        p.service_code = :service_code
+        s.code = :service_code
 """
 )
-result_5 = measure_query_execution_time(
-    "Know the price in different regions of a particular service",
-    query_5,
-    {"service_code": "AmazonS3"},
-)
 
 # Query 6: Know all the products and their prices with a particular product attribute value
 query_6 = text(
     """
-    SELECT p.id, p.product_family_id, p.sku, p.location, p.region_code, pr.pricePerUnit, pr.unit
-    FROM product AS p
+    SELECT p.id, p.product_family_id, p.sku, l.name AS location, r.code AS region_code, pr.pricePerUnit, pr.unit
+    FROM product_attribute AS a
+    JOIN
+        product p ON p.id = a.product_id
+    JOIN
+        service s ON s.id = p.service_id
+    JOIN
+        location l ON l.id = p.location_id
+    JOIN
+        region r ON r.id = p.region_id
     JOIN
         price pr ON p.id = pr.product_id
-    WHERE p.service_code = :service_code
-    AND JSON_EXTRACT(product_attributes, CONCAT('$.', :attribute_name)) = :attribute_value
+    WHERE a.attribute_name = :attribute_name
+    AND a.attribute_value = :attribute_value
+    AND s.code = :service_code
 """
 )
-result_6 = measure_query_execution_time(
-    "Know all the products and their prices with a particular product attribute value",
-    query_6,
-    {
-        "attribute_name": "memory",
-        "service_code": "AmazonRDS",
-        "attribute_value": "1024 GiB",
-    },
-)
 
-# Print the results as a table
-table = tabulate(
-    query_results,
-    headers=["Query Description", "Execution Time (ms)", "No of Rows returned"],
-    tablefmt="grid",
-)
-print(table)
+# Queries of the benchmark with their descriptions and parameters
+QUERIES = [
+    ("Know all product families", query_1, None),
+    ("Know all the services under a product family", query_2, None),
+    ("Know all the services available in a region", query_3, {"region": "us-east-1"}),
+    ("Know all the products of a particular service", query_4, {"service_code": "AmazonS3"}),
+    ("Know the price in different regions of a particular service", query_5, {"service_code": "AmazonS3"}),
+    (
+        "Know all the products and their prices with a particular product attribute value",
+        query_6,
+        {
+            "attribute_name": "memory",
+            "service_code": "AmazonRDS",
+            "attribute_value": "1024 GiB",
+        },
+    ),
+]
+
+
+# Function to get the URL of the database the queries run against, DuckDB snapshots need the duckdb-engine package
+def get_database_url(backend, database, snapshot=None):
+    if backend == "sqlite":
+        return f"sqlite:///{snapshot}"
+    if backend == "duckdb":
+        return f"duckdb:///{snapshot}"
+    return f"mysql+mysqlconnector://{config('DB_USER')}:{config('DB_PASSWORD')}@{config('DB_HOST')}/{database}"
+
+
+# Function to run a query once, timing the execution together with fetching its rows
+def run_query(session_factory, query, parameters=None):
+    session = session_factory()
+    try:
+        with Timer() as timer:
+            rows = (session.execute(query, parameters) if parameters else session.execute(query)).fetchall()
+        return timer.elapsed, len(rows)
+    finally:
+        session.close()
+
+
+# Function to measure a query over warmup and timed iterations
+def measure_query_execution_time(session_factory, query_description, query, parameters=None, iterations=50, warmup=5):
+    # Warmup runs fill the buffer pool and the connection pool so they are not part of the samples
+    for _ in range(warmup):
+        run_query(session_factory, query, parameters)
+
+    samples = []
+    num_rows = 0
+    for _ in range(iterations):
+        elapsed, num_rows = run_query(session_factory, query, parameters)
+        samples.append(elapsed)
+    return {"name": query_description, "rows": num_rows, **summarize_latencies(samples)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the execution time of the queries used by the API.")
+    parser.add_argument("--database", default=config("DB_NAME"), help="Database the queries run against")
+    parser.add_argument("--backend", choices=["mysql", "sqlite", "duckdb"], default="mysql",
+                        help="Run the queries against the MySQL server or a snapshot written by export_snapshot.py")
+    parser.add_argument("--snapshot", help="Snapshot file of the sqlite and duckdb backends")
+    parser.add_argument("--iterations", type=int, default=50, help="Timed runs of every query")
+    parser.add_argument("--warmup", type=int, default=5, help="Untimed runs of every query before measuring")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    if args.backend != "mysql" and not args.snapshot:
+        parser.error(f"--snapshot is required with the {args.backend} backend")
+    engine = create_engine(get_database_url(args.backend, args.database, args.snapshot))
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    # Create a list to store query results
+    query_results = [
+        measure_query_execution_time(session_factory, description, query, parameters, args.iterations, args.warmup)
+        for description, query, parameters in QUERIES
+    ]
+    engine.dispose()
+
+    # Print the results as a table
+    table = tabulate(
+        [
+            (result["name"], result["mean_ms"], result["p50_ms"], result["p95_ms"], result["p99_ms"], result["rows"])
+            for result in query_results
+        ],
+        headers=["Query Description", "Mean (ms)", "p50 (ms)", "p95 (ms)", "p99 (ms)", "No of Rows returned"],
+        tablefmt="grid",
+    )
+    print(table)
+
+    if args.output:
+        parameters = {"backend": args.backend, "database": args.snapshot or args.database,
+                      "iterations": args.iterations, "warmup": args.warmup}
+        write_results(args.output, "queries", parameters, query_results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import csv
+import os
+import sqlite3
+import tempfile
+from decimal import Decimal
+
+try:
+    import duckdb
+except ImportError:
+    # DuckDB is only needed for DuckDB snapshots
+    duckdb = None
+
+# Columns of the tables copied into a snapshot, in the order they are created
+SNAPSHOT_COLUMNS = {
+    "product_family": ("id", "name"),
+    "service": ("id", "code"),
+    "region": ("id", "code"),
+    "location": ("id", "name"),
+    "product": ("id", "product_family_id", "offer_name", "sku", "service_id", "location_id", "region_id", "product_attributes"),
+    "product_attribute": ("attribute_name", "attribute_value", "product_id"),
+    "attribute_stats": ("attribute_name", "attribute_value", "product_count"),
+    "price": ("product_id", "pricePerUnit", "unit", "description"),
+    "price_comparison": ("product_id", "signature", "offer_name", "service_id", "usage_type", "region_id", "location_id",
+                         "sku", "price_per_unit", "unit", "price_rank", "region_count"),
+    "data_version": ("id", "version", "updated_at"),
+}
+
+# Prices are stored as exact decimal text, SQLite's NUMERIC affinity converts them to numbers
+sqlite3.register_adapter(Decimal, str)
+
+
+# Backend writing a read-only SQLite snapshot that the API can serve without a MySQL server
+class SQLiteBackend:
+    # Rowid tables keep the integer primary keys as their rowid, the attribute index is clustered on its key
+    TABLES = {
+        "product_family": "CREATE TABLE product_family (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)",
+        "service": "CREATE TABLE service (id INTEGER PRIMARY KEY, code TEXT NOT NULL UNIQUE)",
+        "region": "CREATE TABLE region (id INTEGER PRIMARY KEY, code TEXT NOT NULL UNIQUE)",
+        "location": "CREATE TABLE location (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)",
+        "product": """
+            CREATE TABLE product (
+                id INTEGER PRIMARY KEY,
+                product_family_id INTEGER,
+                offer_name TEXT,
+                sku TEXT,
+                service_id INTEGER NOT NULL,
+                location_id INTEGER NOT NULL,
+                region_id INTEGER NOT NULL,
+                product_attributes TEXT
+            )
+        """,
+        "product_attribute": """
+            CREATE TABLE product_attribute (
+                attribute_name TEXT NOT NULL,
+                attribute_value TEXT NOT NULL,
+                product_id INTEGER NOT NULL,
+                PRIMARY KEY (attribute_name, attribute_value, product_id)
+            ) WITHOUT ROWID
+        """,
+        "attribute_stats": """
+            CREATE TABLE attribute_stats (
+                attribute_name TEXT NOT NULL,
+                attribute_value TEXT NOT NULL,
+                product_count INTEGER NOT NULL,
+                PRIMARY KEY (attribute_name, attribute_value)
+            ) WITHOUT ROWID
+        """,
+        "price": "CREATE TABLE price (product_id INTEGER, pricePerUnit NUMERIC, unit TEXT, description TEXT)",
+        "price_comparison": """
+            CREATE TABLE price_comparison (
+                product_id INTEGER PRIMARY KEY,
+                signature TEXT NOT NULL,
+                offer_name TEXT NOT NULL,
+                service_id INTEGER NOT NULL,
+                usage_type TEXT,
+                region_id INTEGER NOT NULL,
+                location_id INTEGER NOT NULL,
+                sku TEXT,
+                price_per_unit NUMERIC,
+                unit TEXT,
+                price_rank INTEGER NOT NULL,
+                region_count INTEGER NOT NULL
+            )
+        """,
+        "data_version": "CREATE TABLE data_version (id INTEGER PRIMARY KEY, version INTEGER NOT NULL, updated_at TIMESTAMP)",
+    }
+
+    # Same lookups as the MySQL indexes, created once the rows are in so they are built in a single sorted pass
+    INDEXES = [
+        "CREATE INDEX idx_family_service ON product (product_family_id, service_id)",
+        "CREATE INDEX idx_region_service ON product (region_id, service_id)",
+        "CREATE INDEX idx_service ON product (service_id, id)",
+        "CREATE INDEX idx_service_sku ON product (service_id, sku)",
+        "CREATE INDEX idx_location ON product (location_id)",
+        "CREATE INDEX idx_attribute_product ON product_attribute (product_id)",
+        "CREATE INDEX idx_price_product ON price (product_id)",
+        "CREATE INDEX idx_signature_rank ON price_comparison (signature, price_rank)",
+        "CREATE INDEX idx_comparison_sku ON price_comparison (service_id, sku)",
+        "CREATE INDEX idx_service_cheapest ON price_comparison (service_id, price_rank, price_per_unit)",
+        "CREATE INDEX idx_usage_cheapest ON price_comparison (service_id, usage_type, price_rank, price_per_unit)",
+    ]
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        # The snapshot is rebuilt from scratch if the export fails, so it doesn't need a journal
+        self.connection.execute("PRAGMA journal_mode = OFF")
+        self.connection.execute("PRAGMA synchronous = OFF")
+        self.cursor = self.connection.cursor()
+
+    def create_tables(self):
+        for statement in self.TABLES.values():
+            self.cursor.execute(statement)
+
+    def insert_rows(self, table, columns, rows):
+        self.cursor.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['?'] * len(columns))})", rows
+        )
+
+    def create_indexes(self):
+        for statement in self.INDEXES:
+            self.cursor.execute(statement)
+
+    # Function to collect the planner statistics and compact the file before it is shipped
+    def finish(self):
+        self.cursor.execute("ANALYZE")
+        self.connection.commit()
+        self.cursor.execute("VACUUM")
+        self.connection.close()
+
+
+# Function to encode a value as a field of a DuckDB CSV file, NULL is written as \N
+def csv_field(value):
+    return "\\N" if value is None else str(value)
+
+
+# Backend writing a DuckDB snapshot, its columnar storage suits scans over the whole price comparison
+class DuckDBBackend:
+    # Zone maps of the column segments prune the scans, so only the point lookups get ART indexes
+    TABLES = {
+        "product_family": "CREATE TABLE product_family (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL)",
+        "service": "CREATE TABLE service (id SMALLINT PRIMARY KEY, code VARCHAR NOT NULL)",
+        "region": "CREATE TABLE region (id SMALLINT PRIMARY KEY, code VARCHAR NOT NULL)",
+        "location": "CREATE TABLE location (id SMALLINT PRIMARY KEY, name VARCHAR NOT NULL)",
+        "product": """
+            CREATE TABLE product (
+                id INTEGER,
+                product_family_id INTEGER,
+                offer_name VARCHAR,
+                sku VARCHAR,
+                service_id SMALLINT NOT NULL,
+                location_id SMALLINT NOT NULL,
+                region_id SMALLINT NOT NULL,
+                product_attributes JSON
+            )
+        """,
+        "product_attribute": """
+            CREATE TABLE product_attribute (
+                attribute_name VARCHAR NOT NULL,
+                attribute_value VARCHAR NOT NULL,
+                product_id INTEGER NOT NULL
+            )
+        """,
+        "attribute_stats": """
+            CREATE TABLE attribute_stats (
+                attribute_name VARCHAR NOT NULL,
+                attribute_value VARCHAR NOT NULL,
+                product_count INTEGER NOT NULL
+            )
+        """,
+        "price": "CREATE TABLE price (product_id INTEGER, pricePerUnit DECIMAL(10, 6), unit VARCHAR, description VARCHAR)",
+        "price_comparison": """
+            CREATE TABLE price_comparison (
+                product_id INTEGER,
+                signature VARCHAR NOT NULL,
+                offer_name VARCHAR NOT NULL,
+                service_id SMALLINT NOT NULL,
+                usage_type VARCHAR,
+                region_id SMALLINT NOT NULL,
+                location_id SMALLINT NOT NULL,
+                sku VARCHAR,
+                price_per_unit DECIMAL(10, 6),
+                unit VARCHAR,
+                price_rank INTEGER NOT NULL,
+                region_count INTEGER NOT NULL
+            )
+        """,
+        "data_version": "CREATE TABLE data_version (id INTEGER PRIMARY KEY, version BIGINT NOT NULL, updated_at TIMESTAMP)",
+    }
+
+    INDEXES = [
+        "CREATE INDEX idx_product_id ON product (id)",
+        "CREATE INDEX idx_service_sku ON product (service_id, sku)",
+        "CREATE INDEX idx_signature ON price_comparison (signature)",
+        "CREATE INDEX idx_comparison_sku ON price_comparison (service_id, sku)",
+    ]
+
+    def __init__(self, path):
+        if duckdb is None:
+            raise RuntimeError("The duckdb package is required for DuckDB snapshots, install it with 'pip install duckdb'")
+        self.connection = duckdb.connect(path)
+
+    def create_tables(self):
+        for statement in self.TABLES.values():
+            self.connection.execute(statement)
+
+    # Rows are loaded with COPY from a CSV file, DuckDB inserts prepared statements one row at a time
+    def insert_rows(self, table, columns, rows):
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8", newline="") as csv_file:
+                csv.writer(csv_file, quoting=csv.QUOTE_ALL).writerows([csv_field(value) for value in row] for row in rows)
+            self.connection.execute(
+                f"COPY {table} ({', '.join(columns)}) FROM '{path}' (FORMAT csv, HEADER false, NULL '\\N', QUOTE '\"', ESCAPE '\"')"
+            )
+        finally:
+            os.remove(path)
+
+    def create_indexes(self):
+        for statement in self.INDEXES:
+            self.connection.execute(statement)
+
+    def finish(self):
+        self.connection.execute("CHECKPOINT")
+        self.connection.close()
+
+
+BACKENDS = {"sqlite": SQLiteBackend, "duckdb": DuckDBBackend}
+
+
+# Function to create the backend writing a snapshot to the given file
+def create_backend(backend_name, path):
+    if backend_name not in BACKENDS:
+        raise ValueError(f"Unknown snapshot backend '{backend_name}'")
+    return BACKENDS[backend_name](path)